@@ -1,5 +1,7 @@
+import re
 from collections import defaultdict
-from functools import cache
+from dataclasses import dataclass
+from functools import cached_property
 from typing import Iterable
 
 from scripts.utils import AbstractPuzzleSolver
@@ -10,156 +12,122 @@ class PuzzleSolver(AbstractPuzzleSolver):
     # DAY 3 - Shared code
     ###########################
 
-    # Shared attribute
-    number_digits: list[str] = []
-
-    @property
-    def number_value(self) -> int:
-        return int("".join(self.number_digits))
-
-    def __reset_state_variables(self):
-        self.number_digits = []
-        self.is_part_number = False
-        self.is_part_number_linked_to_star = False
-        self.current_stars = set()
-
-    @cache
-    def __get_char(self, line_idx: int, char_idx: int) -> str | None:
-        # Don't support negative indexes
-        if line_idx < 0 or char_idx < 0:
-            return None
-
-        # Try to retrieve char, return None in case it
-        # doesn't exist (edge-case position)
-        try:
-            return self.lines[line_idx][char_idx]
-        except IndexError:
-            return None
+    @cached_property
+    def schematic(self) -> "Schematic":
+        return Schematic(self.lines)
 
     ###########################
     # DAY 3 - First Part
     ###########################
 
-    # In order to know if current is part number
-    is_part_number: bool = False
-
     def _solve_first_part(self) -> int:
-        # Initialize state variables
-        return sum(self.__get_part_numbers())
-
-    def __get_part_numbers(self) -> Iterable[int]:
-        for line_idx, line in enumerate(self.lines):
-            # New line, check if we had an adjacent number on previous line
-            yield from self.__get_number_if_is_part_number()
-
-            for char_idx, char in enumerate(line):
-                if char.isdigit():
-                    self.number_digits.append(char)
-                    self.is_part_number |= self.__is_part_number(line_idx, char_idx)
-                else:
-                    yield from self.__get_number_if_is_part_number()
-
-        # End of the file, in case there was a number at the end
-        yield from self.__get_number_if_is_part_number()
-
-    def __get_number_if_is_part_number(self) -> Iterable[int]:
-        # In case we don't have any number registered yet
-        if not self.number_digits:
-            return
-
-        # Compute the number
-        number = self.number_value if self.is_part_number else None
-
-        # Reset the state for next number process
-        self.__reset_state_variables()
-
-        # Yield the number if it's a part number
-        if number:
-            yield number
-
-    def __is_part_number(self, line_idx: int, char_idx: int) -> bool:
-        """A number is a "part" number if it's adjacent to at least one symbol"""
-        return any(
-            self.__is_symbol(line_idx + delta_line, char_idx + delta_char)
-            for delta_line in (-1, 0, 1)
-            for delta_char in (-1, 0, 1)
-            if not (delta_line == 0 and delta_char == 0)  # exclude current
-        )
-
-    @cache
-    def __is_symbol(self, line_idx: int, char_idx: int) -> bool:
-        if not (char := self.__get_char(line_idx, char_idx)):
-            return False
-        return char != "." and not char.isdigit()
+        return sum(number.value for number in self.schematic.part_numbers)
 
     ###########################
     # DAY 3 - Second Part
     ###########################
 
-    # In order to know if current is part number
-    is_part_number_linked_to_star: bool = False
+    def _solve_second_part(self) -> int:
+        return sum(gear.get_ratio() for gear in self.schematic.gears)
+
 
-    # List of stars coordinates, linked to current number
-    current_stars: set[tuple[int, int]]
+@dataclass
+class SchematicNumber:
+    """A run of consecutive digits on a line of the schematic"""
 
-    # Star symbols and their linked parts. Ex: (1,1) -> [45, 1458]
-    star_symbols: dict[tuple[int, int], list[int]] = defaultdict(list)
+    line_idx: int
+    start: int
+    end: int  # excluded
+    value: int
 
-    def _solve_second_part(self) -> int:
-        return sum(gear.get_ratio() for gear in self.__get_gears())
+    @property
+    def mask(self) -> int:
+        """Bitmask of the columns covered by the number"""
+        return ((1 << (self.end - self.start)) - 1) << self.start
 
-    def __get_gears(self) -> Iterable["Gear"]:
-        for line_idx, line in enumerate(self.lines):
-            # New line, check if we had an adjacent number on previous line
-            self.__handle_processed_number()
+    @property
+    def neighbours_mask(self) -> int:
+        """Bitmask of the columns covered by the number and its diagonals"""
+        start = max(self.start - 1, 0)
+        return ((1 << (self.end + 1 - start)) - 1) << start
+
+
+class Schematic:
+    """Engine schematic, where each line is stored as bitmasks (bit i is
+    column i), so that adjacency checks are done with a few int operations
+    per number instead of 8 lookups per digit.
+    """
+
+    NUMBER_PATTERN = re.compile(r"\d+")
+    SYMBOL_PATTERN = re.compile(r"[^.\d]")
+    STAR_PATTERN = re.compile(r"\*")
+
+    numbers: list[SchematicNumber]
+    symbols_masks: list[int]
+    stars_masks: list[int]
+
+    def __init__(self, lines: list[str]):
+        self.numbers = [
+            SchematicNumber(line_idx, match.start(), match.end(), int(match.group()))
+            for line_idx, line in enumerate(lines)
+            for match in self.NUMBER_PATTERN.finditer(line)
+        ]
+        self.symbols_masks = [
+            self.__get_mask(line, self.SYMBOL_PATTERN) for line in lines
+        ]
+        self.stars_masks = [self.__get_mask(line, self.STAR_PATTERN) for line in lines]
+
+    @staticmethod
+    def __get_mask(line: str, pattern: re.Pattern) -> int:
+        return sum(1 << match.start() for match in pattern.finditer(line))
+
+    @cached_property
+    def adjacency_masks(self) -> list[int]:
+        """For each line, bitmask of the cells touching a symbol, computed
+        by dilating the symbols masks over a 3x3 window"""
+        horizontal_masks = [
+            mask | (mask << 1) | (mask >> 1) for mask in self.symbols_masks
+        ]
+        padded_masks = [0, *horizontal_masks, 0]
+        return [
+            padded_masks[line_idx - 1]
+            | padded_masks[line_idx]
+            | padded_masks[line_idx + 1]
+            for line_idx in range(1, len(padded_masks) - 1)
+        ]
 
-            for char_idx, char in enumerate(line):
-                if char.isdigit():
-                    self.number_digits.append(char)
-                    self.is_part_number_linked_to_star |= (
-                        self.__is_part_number_linked_to_star(line_idx, char_idx)
-                    )
-                else:
-                    self.__handle_processed_number()
+    @property
+    def part_numbers(self) -> Iterable[SchematicNumber]:
+        """A number is a "part" number if it's adjacent to at least one symbol"""
+        yield from (
+            number
+            for number in self.numbers
+            if number.mask & self.adjacency_masks[number.line_idx]
+        )
 
-        # End of the file, in case there was a number at the end
-        self.__handle_processed_number()
+    @property
+    def gears(self) -> Iterable["Gear"]:
+        # Star symbols and their linked parts. Ex: (1,1) -> [45, 1458]
+        star_symbols: dict[tuple[int, int], list[int]] = defaultdict(list)
+
+        for number in self.numbers:
+            neighbours_mask = number.neighbours_mask
+            for line_idx in self.__get_adjacent_lines(number.line_idx):
+                linked_stars = self.stars_masks[line_idx] & neighbours_mask
+                while linked_stars:
+                    lowest_star = linked_stars & -linked_stars
+                    char_idx = lowest_star.bit_length() - 1
+                    star_symbols[(line_idx, char_idx)].append(number.value)
+                    linked_stars ^= lowest_star
 
         yield from (
             Gear(linked_part_numbers)
-            for linked_part_numbers in self.star_symbols.values()
+            for linked_part_numbers in star_symbols.values()
             if len(linked_part_numbers) == 2
         )
 
-    def __is_part_number_linked_to_star(self, line_idx: int, char_idx: int) -> bool:
-        linked_stars = set(
-            (line_idx + delta_line, char_idx + delta_char)
-            for delta_line in (-1, 0, 1)
-            for delta_char in (-1, 0, 1)
-            if (
-                (not (delta_line == 0 and delta_char == 0))  # exclude current
-                and self.__get_char(line_idx + delta_line, char_idx + delta_char) == "*"
-            )
-        )
-
-        # Add stars to current linked stars if any
-        self.current_stars |= linked_stars
-
-        # Return result depending on found stars
-        return len(linked_stars) > 0
-
-    def __handle_processed_number(self) -> Iterable[int]:
-        # In case we don't have any number registered yet
-        if not self.number_digits:
-            return
-
-        # Compute the number and update the stars symbols if linked to stars
-        if self.is_part_number_linked_to_star:
-            for star_coord in self.current_stars:
-                self.star_symbols[star_coord].append(self.number_value)
-
-        # Reset the state for next number process
-        self.__reset_state_variables()
+    def __get_adjacent_lines(self, line_idx: int) -> range:
+        return range(max(line_idx - 1, 0), min(line_idx + 2, len(self.stars_masks)))
 
 
 class Gear:
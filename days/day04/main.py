@@ -1,54 +1,66 @@
+from collections import deque
 from functools import cached_property
+from typing import Iterable
 
 from scripts.utils import AbstractPuzzleSolver
 
 
 class PuzzleSolver(AbstractPuzzleSolver):
+    ###########################
+    # DAY 4 - Shared code
+    ###########################
+
+    @cached_property
+    def scratchcards(self) -> list["Scratchcard"]:
+        return [Scratchcard(line) for line in self.lines]
+
     ###########################
     # DAY 4 - First Part
     ###########################
 
     def _solve_first_part(self) -> int:
-        return sum(Scratchcard(line).points for line in self.lines)
+        return sum(card.points for card in self.scratchcards)
 
     ###########################
     # DAY 4 - Second Part
     ###########################
 
     def _solve_second_part(self) -> int:
-        # Assemble cards references
-        self.cards_references = self.__get_cards_references()
+        return self.count_cards(self.scratchcards)
 
-        # Init cards count with original ones
-        # card_number -> count
-        self.won_cards: dict[int, int] = {
-            card_number: 1 for card_number in self.cards_references.keys()
-        }
+    @staticmethod
+    def count_cards(cards: Iterable["Scratchcard"]) -> int:
+        """Count the total number of cards (originals and copies) in a single
+        forward pass. As a card only wins copies of the next cards, we only
+        need to keep track of the copies won for the upcoming cards, in a
+        sliding window as long as the biggest number of matches.
+        """
+        nb_cards = 0
 
-        # Get won cards for each original cards
-        for card in self.cards_references.values():
-            self.__get_won_cards(card)
+        # Copies won for the next cards. Ex: [2, 1] -> next card has
+        # 2 copies, the one after has 1 copy
+        pending_copies: deque[int] = deque()
 
-        return sum(self.won_cards.values())
+        for card in cards:
+            # Original card and the copies won by the previous cards
+            nb_copies = 1 + (pending_copies.popleft() if pending_copies else 0)
+            nb_cards += nb_copies
 
-    def __get_cards_references(self) -> dict[int, "Scratchcard"]:
-        cards_references = {}
-        for line in self.lines:
-            card = Scratchcard(line)
-            cards_references[card.number] = card
-        return cards_references
+            # Each copy of the card wins one copy of each of the next cards
+            nb_matches = card.nb_matching_numbers
+            pending_copies.extend([0] * (nb_matches - len(pending_copies)))
+            for next_card_idx in range(nb_matches):
+                pending_copies[next_card_idx] += nb_copies
 
-    def __get_won_cards(self, card: "Scratchcard"):
-        for next_card_number in card.next_cards_numbers:
-            # Add the new won card in the list
-            self.won_cards[next_card_number] += 1
-            # Get won cards associated with this new won card
-            self.__get_won_cards(self.cards_references[next_card_number])
+        return nb_cards
 
 
 class Scratchcard:
-    winning_numbers: set[str]
-    played_numbers: set[str]
+    """Scratchcard with its numbers stored as bitmasks, where bit N
+    is set if the number N is on the card"""
+
+    winning_numbers: int
+    played_numbers: int
     number: int
 
     def __init__(self, line: str):
@@ -56,19 +68,20 @@ class Scratchcard:
         self.number = int(card_number.split()[-1])
 
         winning_data, played_data = scratchcard_data.split("|")
-        self.winning_numbers = set(number.strip() for number in winning_data.split())
-        self.played_numbers = set(number.strip() for number in played_data.split())
+        self.winning_numbers = self.__get_bitmask(winning_data)
+        self.played_numbers = self.__get_bitmask(played_data)
 
-    @cached_property
-    def matching_numbers(self) -> set[str]:
-        return self.winning_numbers & self.played_numbers
+    @staticmethod
+    def __get_bitmask(numbers_data: str) -> int:
+        bitmask = 0
+        for number in numbers_data.split():
+            bitmask |= 1 << int(number)
+        return bitmask
 
     @cached_property
-    def points(self) -> int:
-        return pow(2, len(self.matching_numbers) - 1) if self.matching_numbers else 0
+    def nb_matching_numbers(self) -> int:
+        return (self.winning_numbers & self.played_numbers).bit_count()
 
     @cached_property
-    def next_cards_numbers(self) -> set[int]:
-        start = self.number + 1
-        stop = start + len(self.matching_numbers)
-        return set(range(start, stop))
+    def points(self) -> int:
+        return pow(2, self.nb_matching_numbers - 1) if self.nb_matching_numbers else 0
@@ -1,5 +1,7 @@
+from bisect import bisect_left, bisect_right
 from collections import defaultdict
-from functools import cache, cached_property
+from functools import cached_property, reduce
+from math import inf
 from typing import Iterable
 
 from scripts.utils import AbstractPuzzleSolver
@@ -20,6 +22,13 @@ class PuzzleSolver(AbstractPuzzleSolver):
         seed_numbers_data = self.seed_line.split(":")[1]
         return [int(number) for number in seed_numbers_data.split()]
 
+    @cached_property
+    def seed_to_location_map(self) -> "IntervalIndex":
+        """All the maps compiled into a single one, from seeds to locations"""
+        return reduce(
+            IntervalIndex.then, (current_map.index for current_map in self.maps)
+        )
+
     def solve(self) -> tuple[int, int]:
         self.maps = self.__construct_maps()
         return super().solve()
@@ -51,82 +60,98 @@ class PuzzleSolver(AbstractPuzzleSolver):
 
     def _solve_first_part(self) -> int:
         # Get the lowest location number from the list
-        return min(
-            self.__get_seed_location(seed_number) for seed_number in self.seed_numbers
-        )
-
-    def __get_seed_location(self, seed_number: int) -> int:
-        next_value = seed_number
-
-        # Loop over the maps to retrieve the corresponding value
-        for current_map in self.maps:
-            next_value = current_map.get_destination(next_value)
-
-        return next_value
+        return min(self.seed_to_location_map.get_destinations(self.seed_numbers))
 
     ###########################
     # DAY 5 - Second Part
     ###########################
 
     def _solve_second_part(self) -> int:
-        # Retrieve seeds ranges
-        seed_ranges = self.__get_seed_ranges()
-
-        # Retrieve their ranges locations. We can have several
-        # location ranges for only one initial seed range
-        seed_location_ranges = []
-        for seed_range in seed_ranges:
-            location_ranges = self.__get_seed_location_ranges(seed_range)
-            seed_location_ranges += location_ranges
+        # Retrieve the locations of all the seeds ranges at once. We can have
+        # several location ranges for only one initial seed range.
+        seed_location_ranges = self.seed_to_location_map.get_destination_ranges(
+            self.__get_seed_ranges()
+        )
 
         # Return the minimum start of all the location ranges we have
-        return min(
-            seed_location_range.start for seed_location_range in seed_location_ranges
-        )
+        return seed_location_ranges.min()
 
-    def __get_seed_ranges(self) -> Iterable["SeedRange"]:
-        for i in range(0, len(self.seed_numbers) - 1, 2):
-            yield SeedRange(start=self.seed_numbers[i], length=self.seed_numbers[i + 1])
+    def __get_seed_ranges(self) -> "IntervalSet":
+        starts = self.seed_numbers[0::2]
+        lengths = self.seed_numbers[1::2]
+        return IntervalSet.coalesced(
+            starts, [start + length - 1 for start, length in zip(starts, lengths)]
+        )
 
-    def __get_seed_location_ranges(self, seed_range: "SeedRange") -> list["SeedRange"]:
-        next_ranges = [seed_range]
-        for current_map in self.maps:
-            next_ranges = current_map.get_destination_ranges(next_ranges)
-        return next_ranges
 
+class IntervalSet:
+    """Set of natural numbers stored as sorted, disjoint and non-adjacent
+    intervals, in two parallel lists of starts and ends (included). Operations
+    are done on all the intervals at once, and overlapping or adjacent
+    intervals are always merged, so the number of fragments stays minimal.
+    """
 
-class SeedRange:
-    def __init__(self, start: int, end: int | None = None, length: int | None = None):
-        """Constructor based on start value, and either end value or length"""
-        self.start = start
-        self.end = end
-        self.length = length
+    starts: list[int]
+    ends: list[int]
 
-        if not self.end:
-            self.end = self.start + self.length - 1
-        if not self.length:
-            self.length = self.end - self.start + 1
+    def __init__(self, starts: list[int], ends: list[int]):
+        self.starts = starts
+        self.ends = ends
 
     def __repr__(self):
-        return f"SeedRange({self.start}..{self.end})"
+        return f"IntervalSet({list(zip(self.starts, self.ends))})"
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @classmethod
+    def coalesced(cls, starts: list[int], ends: list[int]) -> "IntervalSet":
+        """Build a set from any intervals, by sorting them and merging
+        the ones overlapping or adjacent to each other"""
+        coalesced_starts: list[int] = []
+        coalesced_ends: list[int] = []
+
+        for start, end in sorted(zip(starts, ends)):
+            # Empty interval, nothing to add
+            if start > end:
+                continue
+
+            # Overlapping or adjacent to the previous interval, extend it
+            if coalesced_ends and start <= coalesced_ends[-1] + 1:
+                coalesced_ends[-1] = max(coalesced_ends[-1], end)
+                continue
+
+            coalesced_starts.append(start)
+            coalesced_ends.append(end)
+
+        return cls(coalesced_starts, coalesced_ends)
+
+    def min(self) -> int:
+        return self.starts[0]
+
+    def max(self) -> int:
+        return self.ends[-1]
 
-    def __sub__(self, other: "SeedRange") -> list["SeedRange"]:
-        """Substract two ranges. As other is necessarily a subpart of self, we'll
-        have two resulting ranges, and one can be empty (if the other is at either
-        left or right edge of self).
-        """
-        difference_ranges = []
+    def intersect(self, start: int, end: int | float) -> "IntervalSet":
+        """Part of the set included in [start, end]"""
+        # Intervals overlapping [start, end] are the ones ending after start
+        # and starting before end. They're contiguous as the set is sorted.
+        first_idx = bisect_left(self.ends, start)
+        last_idx = bisect_right(self.starts, end)
 
-        if self.start != other.start:
-            difference_ranges.append(SeedRange(self.start, other.start - 1))
-        if self.end != other.end:
-            difference_ranges.append(SeedRange(other.end + 1, self.end))
+        starts = self.starts[first_idx:last_idx]
+        ends = self.ends[first_idx:last_idx]
+        if starts:
+            starts[0] = max(starts[0], start)
+            ends[-1] = min(ends[-1], end)
 
-        return [result_range for result_range in difference_ranges if result_range]
+        return IntervalSet(starts, ends)
 
-    def __bool__(self) -> bool:
-        """Used to check if the SeedRange is empty"""
-        return self.length > 0
+    def shift(self, delta: int) -> "IntervalSet":
+        return IntervalSet(
+            [start + delta for start in self.starts],
+            [end + delta for end in self.ends],
+        )
 
 
 class Mapping:
@@ -152,57 +177,6 @@ class Mapping:
             f"Mapping({self.destination_start},{self.source_start},{self.range_length})"
         )
 
-    @cache
-    def get_destination(self, source: int) -> int | None:
-        return (
-            self.destination_start + (source - self.source_start)
-            if self.source_start <= source <= self.source_end
-            else None
-        )
-
-    def process_ranges(
-        self, source_ranges: list[SeedRange], destination_ranges: list[SeedRange]
-    ) -> tuple[list[SeedRange], list[SeedRange]]:
-        updated_source_ranges = []
-        for source_range in source_ranges:
-            # Get the intersection range between the range and the mapping
-            intersection_range = self.get_intersection_range(source_range)
-
-            # In case the range in not included in the mapping
-            # at all, continue to the next mapping
-            if not intersection_range:
-                updated_source_ranges.append(source_range)
-                continue
-
-            # Add the destination of the intersection range
-            # into the destination ranges list
-            destination_ranges.append(self.get_destination_range(intersection_range))
-
-            # Put the remaining source ranges in the updated source ranges
-            # (ranges resulting in the difference between source
-            # range and the intersection)
-            updated_source_ranges += source_range - intersection_range
-
-        # Clean empty source ranges and update the list accordingly
-        source_ranges = [
-            source_range for source_range in updated_source_ranges if source_range
-        ]
-        return source_ranges, destination_ranges
-
-    def get_intersection_range(self, seed_range: SeedRange) -> SeedRange | None:
-        intersection_start = max(self.source_start, seed_range.start)
-        intersection_end = min(self.source_end, seed_range.end)
-        return (
-            SeedRange(start=intersection_start, end=intersection_end)
-            if intersection_start <= intersection_end
-            else None
-        )
-
-    def get_destination_range(self, seed_range: SeedRange) -> SeedRange:
-        return SeedRange(
-            start=seed_range.start + self.delta, end=seed_range.end + self.delta
-        )
-
 
 class Map:
     mappings: list[Mapping]
@@ -217,39 +191,125 @@ class Map:
 
     def add_mapping(self, mapping: Mapping):
         self.mappings.append(mapping)
+        # Invalidate the index, it will be built again on next lookup
+        self.__dict__.pop("index", None)
+
+    @cached_property
+    def index(self) -> "IntervalIndex":
+        return IntervalIndex.from_mappings(self.mappings)
 
     def get_destination(self, source_value: int) -> int:
-        return next(
-            (
-                mapping.get_destination(source_value)
-                for mapping in self.mappings
-                if mapping.get_destination(source_value)
-            ),
-            source_value,
-        )
+        return self.index.get_destination(source_value)
 
-    def get_destination_ranges(self, seed_ranges: list[SeedRange]) -> list[SeedRange]:
-        return [
-            destination
-            for seed_range in seed_ranges
-            for destination in self.__get_seed_range_destinations(seed_range)
-        ]
+    def get_destinations(self, source_values: Iterable[int]) -> list[int]:
+        return self.index.get_destinations(source_values)
+
+
+class IntervalIndex:
+    """Normalized piecewise-linear function over the natural numbers, made of
+    sorted and contiguous segments, each one shifting its values by a delta.
+    Values which are not mapped are kept in explicit identity segments (delta
+    of 0), and two consecutive segments never have the same delta.
 
-    def __get_seed_range_destinations(self, seed_range: SeedRange) -> list[SeedRange]:
-        # Init source and destination ranges
-        source_ranges = [seed_range]
-        destination_ranges = []
+    The segments starts are sorted, so that the segment of a value is found
+    with a binary search instead of a linear scan over the mappings.
+    """
 
-        # Loop over mappings, calculate destination ranges and keep
-        # delta seed ranges mapping after mapping
-        for mapping in self.mappings:
-            source_ranges, destination_ranges = mapping.process_ranges(
-                source_ranges, destination_ranges
-            )
+    # Segment i covers [starts[i], starts[i + 1] - 1], the last one is unbounded
+    starts: list[int]
+    deltas: list[int]
 
-        # If we still have remaining non-empty source ranges after looping
-        # over every mappings, we add them into the result ranges as
-        # destination range which didn't change
-        destination_ranges += source_ranges
+    def __init__(self, starts: list[int], deltas: list[int]):
+        self.starts = starts
+        self.deltas = deltas
 
-        return destination_ranges
+    def __repr__(self):
+        return f"IntervalIndex({list(zip(self.starts, self.deltas))})"
+
+    @classmethod
+    def from_mappings(cls, mappings: list[Mapping]) -> "IntervalIndex":
+        starts, deltas = [0], [0]
+        for mapping in sorted(mappings, key=lambda mapping: mapping.source_start):
+            starts += [mapping.source_start, mapping.source_end + 1]
+            deltas += [mapping.delta, 0]
+        return cls.normalized(starts, deltas)
+
+    @classmethod
+    def normalized(cls, starts: list[int], deltas: list[int]) -> "IntervalIndex":
+        """Build an index from sorted segments, removing empty segments and
+        merging consecutive segments having the same delta"""
+        normalized_starts: list[int] = []
+        normalized_deltas: list[int] = []
+
+        for start, delta in zip(starts, deltas):
+            # Previous segment is empty, it's replaced by the current one
+            if normalized_starts and normalized_starts[-1] == start:
+                normalized_starts.pop()
+                normalized_deltas.pop()
+
+            # Same delta as the previous segment, it's just extended
+            if normalized_deltas and normalized_deltas[-1] == delta:
+                continue
+
+            normalized_starts.append(start)
+            normalized_deltas.append(delta)
+
+        return cls(normalized_starts, normalized_deltas)
+
+    def then(self, other: "IntervalIndex") -> "IntervalIndex":
+        """Compose two indexes into one : values go through self, then through
+        other. The cost only depends on the number of segments of both."""
+        starts: list[int] = []
+        deltas: list[int] = []
+
+        for segment_idx, (start, delta) in enumerate(zip(self.starts, self.deltas)):
+            end = self.__get_segment_end(segment_idx)
+
+            # Split the segment on the boundaries of the segments of other
+            # which are crossed by its image
+            other_idx = bisect_right(other.starts, start + delta) - 1
+            while other_idx < len(other.starts) and (
+                other.starts[other_idx] <= end + delta
+            ):
+                starts.append(max(other.starts[other_idx] - delta, start))
+                deltas.append(delta + other.deltas[other_idx])
+                other_idx += 1
+
+        return self.normalized(starts, deltas)
+
+    def __get_segment_end(self, segment_idx: int) -> int | float:
+        return (
+            self.starts[segment_idx + 1] - 1
+            if segment_idx + 1 < len(self.starts)
+            else inf
+        )
+
+    def get_destination(self, source_value: int) -> int:
+        segment_idx = bisect_right(self.starts, source_value) - 1
+        return source_value + self.deltas[segment_idx]
+
+    def get_destinations(self, source_values: Iterable[int]) -> list[int]:
+        return [self.get_destination(source_value) for source_value in source_values]
+
+    def get_destination_ranges(self, source_ranges: IntervalSet) -> IntervalSet:
+        """Destination ranges of a set of ranges. Each segment overlapping the
+        set shifts its intersection with the set, and the results are merged."""
+        if not source_ranges:
+            return source_ranges
+
+        starts: list[int] = []
+        ends: list[int] = []
+
+        segment_idx = bisect_right(self.starts, source_ranges.min()) - 1
+        while (
+            segment_idx < len(self.starts)
+            and self.starts[segment_idx] <= source_ranges.max()
+        ):
+            destination_ranges = source_ranges.intersect(
+                self.starts[segment_idx], self.__get_segment_end(segment_idx)
+            ).shift(self.deltas[segment_idx])
+            starts += destination_ranges.starts
+            ends += destination_ranges.ends
+            segment_idx += 1
+
+        return IntervalSet.coalesced(starts, ends)
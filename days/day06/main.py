@@ -1,5 +1,7 @@
 from functools import reduce
+from math import isqrt
 from operator import mul
+from typing import Iterable
 
 from scripts.utils import AbstractPuzzleSolver
 
@@ -9,15 +11,9 @@ class PuzzleSolver(AbstractPuzzleSolver):
     # DAY 6 - First Part
     ###########################
     def _solve_first_part(self) -> int:
-        races = self.__compute_races()
-        return reduce(mul, [race.ways_to_win for race in races])
-
-    def __compute_races(self) -> list["Race"]:
         durations = [int(duration) for duration in self.lines[0].split(":")[1].split()]
         distances = [int(distance) for distance in self.lines[1].split(":")[1].split()]
-        return [
-            Race(duration, distance) for duration, distance in zip(durations, distances)
-        ]
+        return reduce(mul, Race.get_ways_to_win(durations, distances))
 
     ###########################
     # DAY 6 - Second Part
@@ -33,17 +29,6 @@ class PuzzleSolver(AbstractPuzzleSolver):
         return Race(duration, distance)
 
 
-class Trial:
-    holding_time: int
-    distance_traveled: int
-
-    def __init__(self, holding_time: int, race_duration: int):
-        self.holding_time = holding_time
-        remaining_time = race_duration - self.holding_time
-        # Speed is the same as the holding time
-        self.distance_traveled = remaining_time * self.holding_time
-
-
 class Race:
     duration: int
     record_distance: int
@@ -67,23 +52,51 @@ class Race:
         Formula : distance = -(holding_time)² + duration * holding_time
         """
 
-        # Retrieve the first trial to win against the record
-        first_won_trial = self.__get_first_won_trial()
+        # Retrieve the first holding time to win against the record
+        first_winning_holding_time = self.__get_first_winning_holding_time()
+        if first_winning_holding_time is None:
+            return 0
 
         # Calculate the number of ways to win depending on it and
         # the total duration of the race. I noticed that the formula is
         # nearly the derivative of the distance function.
-        return (self.duration - 2 * first_won_trial.holding_time) + 1
-
-    def __get_first_won_trial(self) -> Trial:
-        return next(
-            (
-                trial
-                for holding_time in range(self.duration)
-                if (
-                    (trial := Trial(holding_time, self.duration)).distance_traveled
-                    > self.record_distance
-                )
-            ),
-            None,
-        )
+        return (self.duration - 2 * first_winning_holding_time) + 1
+
+    def __get_first_winning_holding_time(self) -> int | None:
+        """Smallest holding time beating the record, which is the first integer
+        after the smallest root of holding_time² - duration * holding_time
+        + record_distance. The root is approximated with an integer square root,
+        then corrected, so that the result is exact even for very big numbers.
+        """
+        # Even the best holding time (middle of the race) doesn't win
+        best_holding_time = self.duration // 2
+        if self.__get_distance(best_holding_time) <= self.record_distance:
+            return None
+
+        discriminant = self.duration**2 - 4 * self.record_distance
+        holding_time = (self.duration - isqrt(discriminant)) // 2
+
+        # Boundary correction, as isqrt and the division are rounded down
+        while self.__get_distance(holding_time) <= self.record_distance:
+            holding_time += 1
+        while (
+            holding_time > 0
+            and self.__get_distance(holding_time - 1) > self.record_distance
+        ):
+            holding_time -= 1
+
+        return holding_time
+
+    def __get_distance(self, holding_time: int) -> int:
+        # Speed is the same as the holding time
+        return (self.duration - holding_time) * holding_time
+
+    @classmethod
+    def get_ways_to_win(
+        cls, durations: Iterable[int], record_distances: Iterable[int]
+    ) -> list[int]:
+        """Number of ways to win for a batch of races"""
+        return [
+            cls(duration, record_distance).ways_to_win
+            for duration, record_distance in zip(durations, record_distances)
+        ]
@@ -1,7 +1,8 @@
-from collections import defaultdict
+from collections import Counter
+from dataclasses import dataclass
 from enum import auto, IntEnum
 from functools import cached_property
-from itertools import product
+from operator import attrgetter
 
 from scripts.utils import AbstractPuzzleSolver
 
@@ -16,22 +17,35 @@ CARDS_STRENGTH_MAPPING = {
 }
 
 
+@dataclass(frozen=True)
+class Rules:
+    cards_strength: dict[str, int]
+    joker: str | None = None
+
+
+# Jack card for first part, better than T but lower than Q
+STANDARD_RULES = Rules(cards_strength=CARDS_STRENGTH_MAPPING)
+
+# Jack card is a Joker for second part, and its value is lower than 2
+JOKER_RULES = Rules(cards_strength=CARDS_STRENGTH_MAPPING | {"J": 1}, joker="J")
+
+
 class PuzzleSolver(AbstractPuzzleSolver):
     ###########################
     # DAY 7 - Common code
     ###########################
     @staticmethod
     def __calculate_total_winnings(hands: list["Hand"]):
-        return sum(hand.bid * i for i, hand in enumerate(hands, start=1))
+        # Hands are sorted on their integer key, no Python comparison needed
+        sorted_hands = sorted(hands, key=attrgetter("sort_key"))
+        return sum(hand.bid * i for i, hand in enumerate(sorted_hands, start=1))
 
     ###########################
     # DAY 7 - First Part
     ###########################
 
     def _solve_first_part(self) -> int:
-        # Jack card for first part, better than T but lower than Q
-        CARDS_STRENGTH_MAPPING["J"] = 11
-        hands = sorted(Hand(line=line) for line in self.lines)
+        hands = [Hand(line=line, rules=STANDARD_RULES) for line in self.lines]
         return self.__calculate_total_winnings(hands)
 
     ###########################
@@ -39,19 +53,14 @@ class PuzzleSolver(AbstractPuzzleSolver):
     ###########################
 
     def _solve_second_part(self) -> int:
-        # Jack card is now a Joker, and its value is lower than 2
-        CARDS_STRENGTH_MAPPING["J"] = 1
-        hands = sorted(Hand(line=line, joker=True) for line in self.lines)
+        hands = [Hand(line=line, rules=JOKER_RULES) for line in self.lines]
         return self.__calculate_total_winnings(hands)
 
 
 class Card:
-    def __init__(self, name: str):
+    def __init__(self, name: str, strength: int):
         self.name = name
-
-    @cached_property
-    def strength(self) -> int:
-        return CARDS_STRENGTH_MAPPING[self.name]
+        self.strength = strength
 
     def __repr__(self):
         return self.name
@@ -63,11 +72,6 @@ class Card:
         return self.strength < other.strength
 
 
-ALL_CARDS_EXCEPT_JOKER: list[Card] = [
-    Card(card_type) for card_type in CARDS_TYPES if card_type != "J"
-]
-
-
 class HandType(IntEnum):
     HIGH_CARD = auto()
     ONE_PAIR = auto()
@@ -78,116 +82,62 @@ class HandType(IntEnum):
     FIVE_OF_A_KIND = auto()
 
 
+# Hand type depending on the signature of the hand, which is the
+# number of cards of each type, sorted in descending order
+HAND_TYPES_BY_SIGNATURE: dict[tuple[int, ...], HandType] = {
+    (5,): HandType.FIVE_OF_A_KIND,
+    (4, 1): HandType.FOUR_OF_A_KIND,
+    (3, 2): HandType.FULL_HOUSE,
+    (3, 1, 1): HandType.THREE_OF_A_KIND,
+    (2, 2, 1): HandType.TWO_PAIR,
+    (2, 1, 1, 1): HandType.ONE_PAIR,
+    (1, 1, 1, 1, 1): HandType.HIGH_CARD,
+}
+
+
 class Hand:
     cards: list[Card]
-    bid: int = 0
-    joker: bool = False
-
-    def __init__(self, line: str = None, joker: bool = False, cards: list[Card] = None):
-        if cards:
-            self.cards = cards
-        else:
-            cards, bid = line.split()
-            self.cards = [Card(card_name) for card_name in cards]
-            self.bid = int(bid)
+    bid: int
+    rules: Rules
 
-        self.joker = joker
+    def __init__(self, line: str, rules: Rules):
+        cards, bid = line.split()
+        self.cards = [
+            Card(card_name, rules.cards_strength[card_name]) for card_name in cards
+        ]
+        self.bid = int(bid)
+        self.rules = rules
 
     @cached_property
     def hand_type(self) -> HandType:
-        # Compute the hand type depending if J is a Joker
-        return (
-            self.__get_best_hand_type()
-            if self.joker
-            else self.__get_hand_type(self.cards)
-        )
+        cards_by_type = Counter(card.name for card in self.cards)
+
+        # Jokers are not counted as a card type of their own
+        nb_jokers = cards_by_type.pop(self.rules.joker, 0)
+
+        # The best hand is always made by turning jokers into the most
+        # frequent card type of the hand
+        signature = sorted(cards_by_type.values(), reverse=True) or [0]
+        signature[0] += nb_jokers
+
+        return HAND_TYPES_BY_SIGNATURE[tuple(signature)]
+
+    @cached_property
+    def sort_key(self) -> int:
+        """Hand encoded into a single integer, so that comparing two hands is
+        only comparing two integers : the hand type is in the high bits, then
+        the strength of each card, one after another, on 4 bits each.
+        """
+        sort_key = self.hand_type
+        for card in self.cards:
+            sort_key = (sort_key << 4) | card.strength
+        return sort_key
 
     def __eq__(self, other: "Hand") -> bool:
         return self.cards == other.cards
 
     def __lt__(self, other: "Hand") -> bool:
-        # First check hand types
-        if self.hand_type != other.hand_type:
-            return self.hand_type < other.hand_type
-
-        # Then, check cards individually, one after another
-        for self_card, other_card in zip(self.cards, other.cards):
-            if self_card != other_card:
-                return self_card < other_card
-
-        # Hands seems equal, so self is not lower than other
-        return False
+        return self.sort_key < other.sort_key
 
     def __repr__(self) -> str:
         return f"Hand(cards={self.cards},bid={self.bid},hand_type={self.hand_type})"
-
-    @staticmethod
-    def __get_hand_type(cards: list[Card]) -> HandType:
-        cards_by_type = defaultdict(int)
-        for card in cards:
-            cards_by_type[card.name] += 1
-
-        different_card_types = len(cards_by_type)
-        cards_amounts = cards_by_type.values()
-
-        # All 5 cards are the same
-        if different_card_types == 1:
-            return HandType.FIVE_OF_A_KIND
-
-        # Four cards are the same
-        if different_card_types == 2 and any(
-            nb_cards == 4 for nb_cards in cards_amounts
-        ):
-            return HandType.FOUR_OF_A_KIND
-
-        # Three cards are the same, and the remaining two as well
-        if different_card_types == 2 and any(
-            nb_cards == 3 for nb_cards in cards_amounts
-        ):
-            return HandType.FULL_HOUSE
-
-        # Three cards are the same, and then remaining two are different
-        if different_card_types == 3 and any(
-            nb_cards == 3 for nb_cards in cards_amounts
-        ):
-            return HandType.THREE_OF_A_KIND
-
-        # Two pairs of cards
-        if different_card_types == 3 and any(
-            nb_cards == 1 for nb_cards in cards_amounts
-        ):
-            return HandType.TWO_PAIR
-
-        # Only one pair of cards
-        if different_card_types == 4 and any(
-            nb_cards == 2 for nb_cards in cards_amounts
-        ):
-            return HandType.ONE_PAIR
-
-        # All card labels are distinct
-        return HandType.HIGH_CARD
-
-    def __get_best_hand_type(self) -> HandType:
-        # Retrieve the joker positions
-        joker_positions: set[int] = {
-            i for i, card in enumerate(self.cards) if card.name == "J"
-        }
-
-        # First, if we don't have any Joker, no need for calculations
-        if not joker_positions:
-            return self.__get_hand_type(self.cards)
-
-        # Get a list of all possible hands
-        possible_hands = self.__get_possible_hands(joker_positions)
-
-        # Return the best possible hand type
-        return max(self.__get_hand_type(hand.cards) for hand in possible_hands)
-
-    def __get_possible_hands(self, joker_positions: set[int]) -> list[Card]:
-        # First, assemble possible cards for each position, depending on joker positions
-        possible_cards = [
-            ALL_CARDS_EXCEPT_JOKER if i in joker_positions else [self.cards[i]]
-            for i in range(5)
-        ]
-
-        return [Hand(cards=cards) for cards in product(*possible_cards)]
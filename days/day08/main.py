@@ -1,26 +1,28 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from enum import StrEnum
-from functools import cached_property
-from itertools import cycle
-from math import lcm
+from functools import cached_property, partial
+from heapq import heapify, heappop, heappush
+from math import ceil, lcm
+from typing import Callable
 
-from scripts.utils import AbstractPuzzleSolver, Multiton
+from scripts.utils import AbstractPuzzleSolver, solve_congruences
 
 
-# Use the Multiton pattern, as a Node will always be the same
-class Node(Multiton):
-    def __init__(self, name: str):
-        self.name = name
+# Maximum number of congruences solutions kept while merging the ghosts
+MAX_CRT_SOLUTIONS = 4096
 
-    def __repr__(self) -> str:
-        return self.name
 
-    @cached_property
-    def is_starting_node(self) -> bool:
-        return self.name.endswith("A")
+def is_starting_node(node_name: str) -> bool:
+    return node_name.endswith("A")
 
-    @cached_property
-    def is_finish_node(self) -> bool:
-        return self.name.endswith("Z")
+
+def is_finish_node(node_name: str) -> bool:
+    return node_name.endswith("Z")
+
+
+def is_last_node(node_name: str) -> bool:
+    return node_name == "ZZZ"
 
 
 class PuzzleSolver(AbstractPuzzleSolver):
@@ -32,66 +34,133 @@ class PuzzleSolver(AbstractPuzzleSolver):
         return self.lines[0]
 
     @cached_property
-    def directions(self) -> list["Direction"]:
-        return [Direction(letter) for letter in self.directions_line]
-
-    @cached_property
-    def network(self) -> dict[str, "NetworkLine"]:
-        return {
-            network_line.start_node: network_line
-            for line in self.lines[2::]
-            if (network_line := NetworkLine(line))
-        }
+    def network(self) -> "CompiledNetwork":
+        return CompiledNetwork(
+            directions=self.directions_line,
+            network_lines=[NetworkLine(line) for line in self.lines[2::] if line],
+        )
 
     ###########################
     # DAY 8 - First Part
     ###########################
-    starting_node: str = Node("AAA")
-    finish_node: str = Node("ZZZ")
+    starting_node: str = "AAA"
 
     def _solve_first_part(self) -> int:
-        nb_steps = 0
-        current_node = self.starting_node
-        for direction in cycle(self.directions):
-            # Travel through the network
-            current_node = self.network[current_node][direction]
-            # Increase number of steps
-            nb_steps += 1
-            # If we arrived on ZZZ, it's finished
-            if current_node == self.finish_node:
-                break
+        return self.network.count_steps(self.starting_node, is_last_node)
 
-        return nb_steps
+    def get_steps(
+        self,
+        start_node: str,
+        is_finish: Callable[[str], bool],
+        direction_offset: int = 0,
+    ) -> int | None:
+        """Steps from a node (at a given offset in the directions) to the
+        nearest node matching a predicate, using the steps index of the
+        network, computed once by predicate"""
+        return self.network.get_steps_index(is_finish).steps_from(
+            start_node, direction_offset
+        )
 
     ###########################
     # DAY 8 - Second Part
     ###########################
     @cached_property
     def starting_nodes(self) -> list[str]:
-        return [node for node in self.network.keys() if node.is_starting_node]
+        return [node for node in self.network.names if is_starting_node(node)]
 
     def _solve_second_part(self) -> int:
-        # Find the steps at which the starting nodes arrives on a Z
-        finish_steps: set[int] = set()
-
-        for starting_node in self.starting_nodes:
-            current_node = starting_node
-            nb_steps = 0
-
-            for direction in cycle(self.directions):
-                # Travel through the network
-                current_node = self.network[current_node][direction]
-                # Increase number of steps
-                nb_steps += 1
-                # If we're on a finish node, we keep track of it
-                # and we stop the exploration for this node
-                if current_node.is_finish_node:
-                    finish_steps.add(nb_steps)
-                    break
+        # Find the cycle of each ghost, the searches are independent so they're
+        # done in parallel. The finish offsets are computed once here, and the
+        # workers only get the tables they need, not the whole network.
+        find_cycle = partial(
+            find_ghost_cycle,
+            pass_destinations=self.network.pass_jumps[0],
+            finish_offsets=self.network.get_finish_offsets(is_finish_node),
+            nb_directions=len(self.network.directions),
+        )
+        with ProcessPoolExecutor() as executor:
+            ghosts_cycles = list(
+                executor.map(
+                    find_cycle, (self.network.ids[node] for node in self.starting_nodes)
+                )
+            )
+
+        # Find the first step at which all ghosts are on a Z
+        return self.__get_first_common_finish_step(ghosts_cycles)
+
+    @staticmethod
+    def __get_first_common_finish_step(
+        ghosts_cycles: list["GhostCycle"],
+    ) -> int | None:
+        # Before the end of the longest pre-period, at least one of the
+        # ghosts is still in its pre-period, so the step must be one of
+        # its pre-period finish steps
+        pre_period_finish_steps = sorted(
+            {
+                step
+                for ghost_cycle in ghosts_cycles
+                for step in ghost_cycle.pre_period_finish_steps
+            }
+        )
+        for step in pre_period_finish_steps:
+            if all(ghost_cycle.is_finish_at(step) for ghost_cycle in ghosts_cycles):
+                return step
 
-        # Calculate the lower common multiple for all of
-        # these, this is the number we're interested in
-        return lcm(*finish_steps)
+        # After that, all ghosts are in their cycle. Ghosts are added one at a
+        # time, the ones with the fewest finish steps first : the steps at
+        # which all the ghosts so far are on a Z are the solutions of (step,
+        # period) congruences, merged with each finish step of the next ghost.
+        # Equal solutions are only kept once, and there is no need to go on
+        # once there is none left.
+        sorted_ghosts_cycles = sorted(
+            ghosts_cycles, key=lambda ghost_cycle: len(ghost_cycle.cycle_finish_steps)
+        )
+        solutions: set[tuple[int, int]] = {(0, 1)}
+        while sorted_ghosts_cycles:
+            ghost_cycle = sorted_ghosts_cycles[0]
+            if len(solutions) * len(ghost_cycle.cycle_finish_steps) > MAX_CRT_SOLUTIONS:
+                break
+
+            sorted_ghosts_cycles.pop(0)
+            solutions = {
+                solution
+                for step, period in solutions
+                for finish_step in ghost_cycle.cycle_finish_steps
+                if (
+                    solution := solve_congruences(
+                        [(step, period), (finish_step, ghost_cycle.cycle_length)]
+                    )
+                )
+            }
+            if not solutions:
+                return None
+
+        # Get the first solutions after the pre-periods
+        min_step = max(ghost_cycle.pre_period for ghost_cycle in ghosts_cycles) + 1
+        first_steps = [
+            (step + ceil(max(min_step - step, 0) / period) * period, period)
+            for step, period in solutions
+        ]
+        if not sorted_ghosts_cycles:
+            return min(step for step, _ in first_steps)
+
+        # Too many solutions to add the remaining ghosts : walk the steps of
+        # the solutions in increasing order, and check the remaining ghosts
+        # on each of them. After the lcm of all the cycle lengths, the ghosts
+        # are all back to the same states, no need to go further.
+        max_step = min_step + lcm(
+            *(ghost_cycle.cycle_length for ghost_cycle in ghosts_cycles)
+        )
+        heapify(first_steps)
+        while first_steps and first_steps[0][0] < max_step:
+            step, period = heappop(first_steps)
+            if all(
+                ghost_cycle.is_finish_at(step) for ghost_cycle in sorted_ghosts_cycles
+            ):
+                return step
+            heappush(first_steps, (step + period, period))
+
+        return None
 
 
 class Direction(StrEnum):
@@ -100,17 +169,17 @@ class Direction(StrEnum):
 
 
 class NetworkLine:
-    start_node: Node
-    left_node: Node
-    right_node: Node
+    start_node: str
+    left_node: str
+    right_node: str
 
     def __init__(self, line: str):
         start, directions = [text.strip() for text in line.split("=")]
-        self.start_node = Node(start)
+        self.start_node = start
 
         directions = directions.lstrip("(").rstrip(")")
         self.left_node, self.right_node = [
-            Node(text.strip()) for text in directions.split(",")
+            text.strip() for text in directions.split(",")
         ]
 
     def __repr__(self) -> str:
@@ -121,11 +190,289 @@ class NetworkLine:
             f"right={self.right_node})"
         )
 
-    def __getitem__(self, direction: Direction) -> Node:
-        match direction:
-            case Direction.LEFT:
-                return self.left_node
-            case Direction.RIGHT:
-                return self.right_node
-            case _:
-                raise ValueError("Invalid direction")
+
+@dataclass
+class GhostCycle:
+    """Steps at which a ghost is on a finish node. After the pre-period, the
+    states (node, direction index) of the ghost are looping every cycle length
+    steps, so it's on a finish node at cycle finish steps + k * cycle length.
+    """
+
+    pre_period: int
+    cycle_length: int
+    pre_period_finish_steps: frozenset[int]
+    cycle_finish_steps: frozenset[int]
+
+    def is_finish_at(self, step: int) -> bool:
+        if step <= self.pre_period:
+            return step in self.pre_period_finish_steps
+
+        # Get the equivalent step in the first cycle
+        step = (step - self.pre_period - 1) % self.cycle_length + self.pre_period + 1
+        return step in self.cycle_finish_steps
+
+
+def find_ghost_cycle(
+    start_node: int,
+    pass_destinations: list[int],
+    finish_offsets: dict[int, list[int]],
+    nb_directions: int,
+) -> GhostCycle:
+    """Find the cycle of a ghost over the (node, direction index) states.
+    The direction index is 0 at the beginning of each pass, so the states
+    are looping as soon as a node at the beginning of a pass repeats.
+
+    Only needs the node reached after a pass from each node, and the steps of
+    a pass arriving on a finish node (for the nodes having some), so that it
+    can be run in another process without sending the whole network.
+    """
+    # Node at the beginning of the pass -> pass index
+    passes_indexes: dict[int, int] = {}
+    node = start_node
+    while node not in passes_indexes:
+        passes_indexes[node] = len(passes_indexes)
+        node = pass_destinations[node]
+
+    pre_period = passes_indexes[node] * nb_directions
+    finish_steps = [
+        pass_idx * nb_directions + offset
+        for pass_node, pass_idx in passes_indexes.items()
+        for offset in finish_offsets.get(pass_node, ())
+    ]
+
+    return GhostCycle(
+        pre_period=pre_period,
+        cycle_length=len(passes_indexes) * nb_directions - pre_period,
+        pre_period_finish_steps=frozenset(
+            step for step in finish_steps if step <= pre_period
+        ),
+        cycle_finish_steps=frozenset(
+            step for step in finish_steps if step > pre_period
+        ),
+    )
+
+
+class CompiledNetwork:
+    """Network compiled to integer node identifiers, where moving from a node
+    is only a lookup in the left or right list.
+
+    A "pass" is a walk over the whole directions string. The destination of
+    every node after 2^k passes is stored for each level k (binary lifting),
+    so that long walks are done in large jumps instead of step by step.
+    """
+
+    names: list[str]
+    ids: dict[str, int]
+    left: list[int]
+    right: list[int]
+    directions: str
+
+    # For each step of a pass, the list of moves to use (left or right)
+    moves: list[list[int]]
+
+    # pass_jumps[k][node] is the node reached after 2^k passes from node
+    pass_jumps: list[list[int]]
+
+    def __init__(self, directions: str, network_lines: list[NetworkLine]):
+        self.names = [network_line.start_node for network_line in network_lines]
+        self.ids = {name: node for node, name in enumerate(self.names)}
+        self.left = [self.ids[network_line.left_node] for network_line in network_lines]
+        self.right = [
+            self.ids[network_line.right_node] for network_line in network_lines
+        ]
+        self.directions = directions
+        self.moves = [
+            self.left if direction == Direction.LEFT else self.right
+            for direction in directions
+        ]
+        self.pass_jumps = [self.__compute_pass_destinations()]
+
+        # Tables of finish nodes by predicate, see __get_finish_tables
+        self.__finish_tables: dict[Callable[[str], bool], tuple] = {}
+
+        # Steps indexes by predicate, see get_steps_index
+        self.__steps_indexes: dict[Callable[[str], bool], StepsIndex] = {}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __compute_pass_destinations(self) -> list[int]:
+        destinations = list(range(len(self)))
+        for moves in self.moves:
+            destinations = [moves[node] for node in destinations]
+        return destinations
+
+    def __get_pass_jumps(self, level: int) -> list[int]:
+        # Compute missing levels from the previous ones : doing 2^(k+1)
+        # passes is doing 2^k passes twice
+        while len(self.pass_jumps) <= level:
+            last_jumps = self.pass_jumps[-1]
+            self.pass_jumps.append([last_jumps[node] for node in last_jumps])
+        return self.pass_jumps[level]
+
+    def walk(self, start_node: str, nb_steps: int) -> str:
+        """Node reached after the given number of steps from the start node"""
+        nb_passes, nb_remaining_steps = divmod(nb_steps, len(self.directions))
+
+        # First, jump over the full passes, using the binary
+        # decomposition of the number of passes
+        node = self.ids[start_node]
+        level = 0
+        while nb_passes:
+            if nb_passes & 1:
+                node = self.__get_pass_jumps(level)[node]
+            nb_passes >>= 1
+            level += 1
+
+        # Then, do the remaining steps one by one
+        for moves in self.moves[:nb_remaining_steps]:
+            node = moves[node]
+
+        return self.names[node]
+
+    def count_steps(
+        self, start_node: str, is_finish: Callable[[str], bool]
+    ) -> int | None:
+        """Number of steps needed to go from the start node to the first
+        finish node, or None if no finish node can be reached"""
+        finish_offsets, finish_jumps = self.__get_finish_tables(is_finish)
+
+        node = self.ids[start_node]
+        if not finish_jumps[-1][node]:
+            return None
+
+        # Jump over the largest number of passes without any finish node,
+        # the first finish node is then in the next pass
+        nb_passes = 0
+        for level in reversed(range(len(finish_jumps))):
+            if not finish_jumps[level][node]:
+                node = self.__get_pass_jumps(level)[node]
+                nb_passes += 1 << level
+
+        return nb_passes * len(self.directions) + finish_offsets[node][0]
+
+    def get_steps_index(self, is_finish: Callable[[str], bool]) -> "StepsIndex":
+        if is_finish not in self.__steps_indexes:
+            self.__steps_indexes[is_finish] = StepsIndex(self, is_finish)
+        return self.__steps_indexes[is_finish]
+
+    def get_finish_offsets(
+        self, is_finish: Callable[[str], bool]
+    ) -> dict[int, list[int]]:
+        """For each node from which a pass goes through finish nodes, the
+        steps of the pass arriving on them"""
+        finish_offsets, _ = self.__get_finish_tables(is_finish)
+        return {node: offsets for node, offsets in enumerate(finish_offsets) if offsets}
+
+    def get_ghost_cycle(
+        self, start_node: str, is_finish: Callable[[str], bool]
+    ) -> GhostCycle:
+        return find_ghost_cycle(
+            self.ids[start_node],
+            pass_destinations=self.pass_jumps[0],
+            finish_offsets=self.get_finish_offsets(is_finish),
+            nb_directions=len(self.directions),
+        )
+
+    def __get_finish_tables(
+        self, is_finish: Callable[[str], bool]
+    ) -> tuple[list[list[int]], list[list[bool]]]:
+        """Compute (once by predicate) the tables used to find finish nodes :
+        - for each node, the steps of a pass from it arriving on a finish node
+        - for each level k, if a finish node is reached within 2^k passes
+        """
+        if is_finish in self.__finish_tables:
+            return self.__finish_tables[is_finish]
+
+        is_finish_node = [is_finish(name) for name in self.names]
+
+        # Walk a pass from all the nodes at once
+        finish_offsets: list[list[int]] = [[] for _ in range(len(self))]
+        current_nodes = list(range(len(self)))
+        for offset, moves in enumerate(self.moves, start=1):
+            current_nodes = [moves[node] for node in current_nodes]
+            for start_node, node in enumerate(current_nodes):
+                if is_finish_node[node]:
+                    finish_offsets[start_node].append(offset)
+
+        # Nodes at the beginning of the passes are looping after at most
+        # one pass by node, no need to go further
+        finish_jumps = [[bool(offsets) for offsets in finish_offsets]]
+        for level in range(len(self).bit_length()):
+            last_finishes = finish_jumps[-1]
+            pass_jumps = self.__get_pass_jumps(level)
+            finish_jumps.append(
+                [
+                    last_finishes[node] or last_finishes[pass_jumps[node]]
+                    for node in range(len(self))
+                ]
+            )
+
+        self.__finish_tables[is_finish] = finish_offsets, finish_jumps
+        return finish_offsets, finish_jumps
+
+
+class StepsIndex:
+    """Number of steps from every state (node, direction index) of a network
+    to the nearest node matching a predicate, computed once for all states so
+    that each query is only a lookup.
+
+    As each state has only one next state, the number of steps of a state is
+    the one of its next state plus one, unless the next node is a finish node.
+    """
+
+    # Marker of states being computed, before their number of steps is known
+    IN_PROGRESS = -1
+
+    network: CompiledNetwork
+
+    # Steps for each state, at index direction_idx * nb_nodes + node. None
+    # if no finish node can be reached from the state.
+    steps: list[int | None]
+
+    def __init__(self, network: CompiledNetwork, is_finish: Callable[[str], bool]):
+        self.network = network
+        self.steps = self.__compute_steps(is_finish)
+
+    def __compute_steps(self, is_finish: Callable[[str], bool]) -> list[int | None]:
+        nb_nodes, nb_directions = len(self.network), len(self.network.directions)
+        is_finish_node = [is_finish(name) for name in self.network.names]
+
+        # 0 means the state has not been visited yet
+        steps: list[int | None] = [0] * (nb_nodes * nb_directions)
+
+        for first_state in range(len(steps)):
+            # Walk from the state until we reach a state with known steps, a
+            # finish node, or a state of the current path (loop without any
+            # finish node), keeping track of the path
+            path: list[int] = []
+            state = first_state
+            while steps[state] == 0:
+                steps[state] = self.IN_PROGRESS
+                path.append(state)
+
+                direction_idx, node = divmod(state, nb_nodes)
+                next_node = self.network.moves[direction_idx][node]
+                if is_finish_node[next_node]:
+                    path_steps = 0
+                    break
+
+                state = ((direction_idx + 1) % nb_directions) * nb_nodes + next_node
+            else:
+                path_steps = None if steps[state] == self.IN_PROGRESS else steps[state]
+
+            # Then go back on the path to set the steps of its states
+            for state in reversed(path):
+                if path_steps is not None:
+                    path_steps += 1
+                steps[state] = path_steps
+
+        return steps
+
+    def steps_from(self, start_node: str, direction_offset: int = 0) -> int | None:
+        """Number of steps from the start node, beginning at the given offset
+        in the directions, to the nearest finish node"""
+        direction_idx = direction_offset % len(self.network.directions)
+        return self.steps[
+            direction_idx * len(self.network) + self.network.ids[start_node]
+        ]
@@ -1,22 +1,71 @@
-from functools import cached_property
+from collections import defaultdict
+from functools import cached_property, lru_cache
+from math import factorial, prod
+from typing import Iterable
 
 from scripts.utils import AbstractPuzzleSolver
 
 
 class PuzzleSolver(AbstractPuzzleSolver):
+    ###########################
+    # DAY 9 - Shared code
+    ###########################
+
+    @cached_property
+    def sequences(self) -> "Sequences":
+        return Sequences(Sequence(line=line) for line in self.lines)
+
     ###########################
     # DAY 9 - First Part
     ###########################
 
     def _solve_first_part(self) -> int:
-        return sum(Sequence(line=line).next_value for line in self.lines)
+        return self.sequences.next_values_sum
 
     ###########################
     # DAY 9 - Second Part
     ###########################
 
     def _solve_second_part(self) -> int:
-        return sum(Sequence(line=line).previous_value for line in self.lines)
+        return self.sequences.previous_values_sum
+
+
+# Number of coefficients tables kept in memory, by (length, steps)
+EXTRAPOLATION_CACHE_SIZE = 1024
+
+
+@lru_cache(maxsize=EXTRAPOLATION_CACHE_SIZE)
+def get_extrapolation_coefficients(length: int, nb_steps: int) -> tuple[int, ...]:
+    """Reducing a sequence of n numbers until only zeros remain, then going
+    back up, is the same as saying its n-th differences are zero, so the
+    numbers are the values of a polynomial of degree n-1 on 0..n-1.
+
+    The value nb_steps after the end of the sequence (or before its beginning
+    if nb_steps is negative) is then given by Lagrange interpolation, as a
+    linear combination of the numbers. For the next value, it's :
+    next = sum((-1)^(n-1-i) * C(n, i) * numbers[i])
+    """
+    if nb_steps == 0:
+        raise ValueError("Number of steps must not be 0")
+
+    position = length - 1 + nb_steps if nb_steps > 0 else nb_steps
+
+    # Product of (position - j) for all j in 0..n-1, as position is outside
+    # of the sequence, it's never 0
+    positions_product = prod(position - j for j in range(length))
+
+    return tuple(
+        (-1) ** (length - 1 - i)
+        * (positions_product // (position - i))
+        // (factorial(i) * factorial(length - 1 - i))
+        for i in range(length)
+    )
+
+
+def dot_product(coefficients: Iterable[int], numbers: Iterable[int]) -> int:
+    return sum(
+        coefficient * number for coefficient, number in zip(coefficients, numbers)
+    )
 
 
 class Sequence:
@@ -36,29 +85,66 @@ class Sequence:
 
     @cached_property
     def next_value(self) -> int:
-        # The next value for the final sequence is always 0
-        if self.is_final_sequence:
-            return 0
-
-        return self[-1] + self.next_sequence.next_value
+        return self.extrapolate(1)
 
     @cached_property
     def previous_value(self) -> int:
-        # The previous value for the final sequence is always 0
-        if self.is_final_sequence:
-            return 0
-
-        return self[0] - self.next_sequence.previous_value
+        return self.extrapolate(-1)
+
+    def extrapolate(self, nb_steps: int) -> int:
+        """Value nb_steps after the end of the sequence, or before its
+        beginning if nb_steps is negative"""
+        return dot_product(
+            get_extrapolation_coefficients(len(self), nb_steps), self.numbers
+        )
+
+
+class Sequences:
+    """Batch of sequences, grouped by length, so that the coefficients are
+    only retrieved once for each length. Extrapolating is a linear operation,
+    so the sum of the extrapolated values of sequences of the same length is
+    the extrapolated value of the sum of these sequences : only one dot
+    product is needed for each length.
+    """
+
+    sequences: list[Sequence]
+
+    # Sum of the sequences (element by element) for each length
+    totals_by_length: dict[int, list[int]]
+
+    def __init__(self, sequences: Iterable[Sequence]):
+        self.sequences = list(sequences)
+        self.totals_by_length = defaultdict(list)
+        for sequence in self.sequences:
+            total = self.totals_by_length[len(sequence)]
+            if not total:
+                total.extend(sequence.numbers)
+                continue
+            for i, number in enumerate(sequence.numbers):
+                total[i] += number
 
     @cached_property
-    def next_sequence(self) -> "Sequence":
-        # There is no next sequence if this is the final one
-        if self.is_final_sequence:
-            return None
-
-        # Next sequence composition
-        return Sequence(numbers=[self[i] - self[i - 1] for i in range(1, len(self))])
+    def next_values_sum(self) -> int:
+        return self.extrapolate_sum(1)
 
     @cached_property
-    def is_final_sequence(self) -> bool:
-        return all(number == 0 for number in self)
+    def previous_values_sum(self) -> int:
+        return self.extrapolate_sum(-1)
+
+    def extrapolate(self, nb_steps: int) -> list[int]:
+        """Extrapolated value of each sequence, in the same order"""
+        coefficients_by_length = {
+            length: get_extrapolation_coefficients(length, nb_steps)
+            for length in self.totals_by_length
+        }
+        return [
+            dot_product(coefficients_by_length[len(sequence)], sequence.numbers)
+            for sequence in self.sequences
+        ]
+
+    def extrapolate_sum(self, nb_steps: int) -> int:
+        """Sum of the extrapolated values of all the sequences"""
+        return sum(
+            dot_product(get_extrapolation_coefficients(length, nb_steps), total)
+            for length, total in self.totals_by_length.items()
+        )
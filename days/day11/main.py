@@ -1,7 +1,11 @@
-from dataclasses import dataclass, field
-from itertools import combinations, count
+from array import array
+from bisect import bisect_left
+from functools import cached_property
+from mmap import ACCESS_READ, mmap
+from pathlib import Path
+from typing import Iterable, Sequence
 
-from scripts.utils import AbstractPuzzleSolver, min_and_max
+from scripts.utils import AbstractPuzzleSolver
 
 EMPTY_SPACE_SYMBOL = "."
 GALAXY_SYMBOL = "#"
@@ -12,59 +16,51 @@ class PuzzleSolver(AbstractPuzzleSolver):
     # DAY 11 - Common Part
     ###########################
     universe: "Universe"
-    galaxy_pairs: list[tuple["Galaxy", "Galaxy"]]
-    expandable_lines: set[int]
-    expandable_columns: set[int]
 
     def solve(self) -> tuple[int, int]:
         # First, create the universe, but don't expand it
         self.universe = Universe(self.lines)
+        return super().solve()
 
-        # Create pairs of galaxies now, before expansion
-        self.galaxy_pairs = list(combinations(self.universe.galaxies, 2))
+    @cached_property
+    def distances_sums(self) -> tuple[int, int]:
+        """The shortest path between two galaxies, by only going up/right/down/
+        left, is the sum of the distances on each axis. On an axis, the expanded
+        coordinate of a galaxy is its initial coordinate, plus (expansion_factor
+        - 1) for each expandable line (or column) before it.
 
-        # Get expandable columns and lines
+        So the sum of all the shortest paths is linear in the expansion factor :
+        initial_distances + (expansion_factor - 1) * expandable_distances.
+        Return these two sums, computed once for all factors.
+        """
         (
-            self.expandable_lines,
-            self.expandable_columns,
+            expandable_lines,
+            expandable_columns,
         ) = self.universe.get_expandable_lines_and_columns()
 
-        return super().solve()
-
-    def __get_shortest_path_length(self, galaxy_pair: tuple["Galaxy", "Galaxy"]) -> int:
-        # First calculate the distance before expansion
-        initial_distance = self.__get_initial_distance(galaxy_pair)
-        first_galaxy, second_galaxy = galaxy_pair
-
-        # Then, calculate how much we must travel in addition because of expansion
-        # For that, retrieve the number of expanded columns and lines we have
-        # between the two galaxies
-        min_x, max_x = min_and_max(first_galaxy.pos.x, second_galaxy.pos.x)
-        nb_lines = sum(
-            1 for line_idx in self.expandable_lines if line_idx in range(min_x, max_x)
-        )
-
-        min_y, max_y = min_and_max(first_galaxy.pos.y, second_galaxy.pos.y)
-        nb_columns = sum(
-            1
-            for column_idx in self.expandable_columns
-            if column_idx in range(min_y, max_y)
-        )
-
-        # We use self.expansion_factory - 1, as we already counted the column once
-        # in the initial distance calculation
-        expansion_distance = (nb_lines + nb_columns) * (self.expansion_factor - 1)
-
-        return initial_distance + expansion_distance
-
-    def __get_initial_distance(self, galaxy_pair: tuple["Galaxy", "Galaxy"]) -> int:
-        """The shortest past, by only going up/right/down/left, is just the sum of
-        the absolute value of difference between coordinates.
-        """
-        first_galaxy, second_galaxy = galaxy_pair
-        y_diff = abs(second_galaxy.pos.y - first_galaxy.pos.y)
-        x_diff = abs(second_galaxy.pos.x - first_galaxy.pos.x)
-        return x_diff + y_diff
+        initial_distances, expandable_distances = 0, 0
+        for coordinates, expandable_indexes in (
+            # Lines are read in order, so galaxies lines are already sorted
+            (self.universe.galaxies_lines, expandable_lines),
+            (sorted(self.universe.galaxies_columns), expandable_columns),
+        ):
+            initial_distances += get_pairwise_distances_sum(coordinates)
+            # Number of expandable indexes before each coordinate, still sorted
+            expandable_distances += get_pairwise_distances_sum(
+                [
+                    bisect_left(expandable_indexes, coordinate)
+                    for coordinate in coordinates
+                ]
+            )
+
+        return initial_distances, expandable_distances
+
+    def get_shortest_paths_sums(self, expansion_factors: Iterable[int]) -> list[int]:
+        initial_distances, expandable_distances = self.distances_sums
+        return [
+            initial_distances + (expansion_factor - 1) * expandable_distances
+            for expansion_factor in expansion_factors
+        ]
 
     ###########################
     # DAY 11 - First Part
@@ -73,13 +69,7 @@ class PuzzleSolver(AbstractPuzzleSolver):
     def _solve_first_part(self) -> int:
         # For the first part, the expansion of the universe is just
         # doubling the empty lines and columns
-        self.expansion_factor = 2
-
-        # Return the sum of their shortest path length
-        return sum(
-            self.__get_shortest_path_length(galaxy_pair)
-            for galaxy_pair in self.galaxy_pairs
-        )
+        return self.get_shortest_paths_sums([2])[0]
 
     ###########################
     # DAY 11 - Second Part
@@ -88,62 +78,100 @@ class PuzzleSolver(AbstractPuzzleSolver):
     def _solve_second_part(self) -> int:
         # For the second part, the expansion of the universe is multiplying
         # by 1_000_000 the empty lines and columns
-        self.expansion_factor = 1_000_000
-
-        # Return the sum of their shortest path length
-        return sum(
-            self.__get_shortest_path_length(galaxy_pair)
-            for galaxy_pair in self.galaxy_pairs
-        )
-
+        return self.get_shortest_paths_sums([1_000_000])[0]
 
-@dataclass
-class Position:
-    x: int  # line index
-    y: int  # column index
 
-
-@dataclass
-class Galaxy:
-    identifier: int = field(default_factory=count().__next__, init=False)
-    pos: Position
+def get_pairwise_distances_sum(sorted_values: Sequence[int]) -> int:
+    """Sum of |a - b| for all pairs of values. As values are sorted, each value
+    is greater than all the previous ones, so the distances to the previous
+    values are computed at once with a prefix sum."""
+    distances_sum, prefix_sum = 0, 0
+    for idx, value in enumerate(sorted_values):
+        distances_sum += idx * value - prefix_sum
+        prefix_sum += value
+    return distances_sum
 
 
 class Universe:
-    data: list[list[str]]
-
-    def __init__(self, lines: list[str]):
-        self.data = [[char for char in line] for line in lines]
-
-    def __repr__(self):
-        return "\n".join("".join(line) for line in self.data)
+    """Universe read in a single pass over its lines, without keeping them :
+    only the coordinates of the galaxies are stored, in compact int arrays,
+    and whether each line and each column contains at least one galaxy, in
+    bitmaps. Memory then depends on the number of galaxies, not on the
+    universe area.
+    """
+
+    # Coordinates of the galaxies, galaxy i is at (lines[i], columns[i])
+    galaxies_lines: array
+    galaxies_columns: array
+
+    nb_lines: int
+    nb_columns: int
+
+    # Bit i is set if the line (or column) i contains at least one galaxy
+    occupied_lines: bytearray
+    occupied_columns: bytearray
+
+    def __init__(self, lines: Iterable[str | bytes]):
+        self.galaxies_lines = array("l")
+        self.galaxies_columns = array("l")
+        self.nb_lines, self.nb_columns = 0, 0
+        self.occupied_lines = bytearray()
+        self.occupied_columns = bytearray()
+
+        for line_idx, line in enumerate(lines):
+            line = line.rstrip()
+            galaxy_symbol = (
+                GALAXY_SYMBOL.encode() if isinstance(line, bytes) else GALAXY_SYMBOL
+            )
+
+            self.nb_lines = line_idx + 1
+            self.nb_columns = max(self.nb_columns, len(line))
+            grow_bitmap(self.occupied_lines, self.nb_lines)
+            grow_bitmap(self.occupied_columns, self.nb_columns)
+
+            # Jump from one galaxy to the next one on the line
+            column_idx = line.find(galaxy_symbol)
+            while column_idx != -1:
+                self.galaxies_lines.append(line_idx)
+                self.galaxies_columns.append(column_idx)
+                set_bit(self.occupied_lines, line_idx)
+                set_bit(self.occupied_columns, column_idx)
+                column_idx = line.find(galaxy_symbol, column_idx + 1)
+
+    @classmethod
+    def from_file(cls, file_path: Path) -> "Universe":
+        """Read the universe from a memory-mapped file, line by line"""
+        with file_path.open("rb") as file:
+            with mmap(file.fileno(), 0, access=ACCESS_READ) as mapped_file:
+                return cls(iter(mapped_file.readline, b""))
+
+    def __len__(self) -> int:
+        return len(self.galaxies_lines)
+
+    def get_expandable_lines_and_columns(self) -> tuple[list[int], list[int]]:
+        """Lines and columns without any galaxy, sorted"""
+        return (
+            get_unset_bits(self.occupied_lines, self.nb_lines),
+            get_unset_bits(self.occupied_columns, self.nb_columns),
+        )
 
-    @property
-    def galaxies(self) -> list[Galaxy]:
-        return [
-            Galaxy(pos=Position(line_idx, column_idx))
-            for line_idx, line in enumerate(self.data)
-            for column_idx, char in enumerate(line)
-            if char == GALAXY_SYMBOL
-        ]
 
-    def get_expandable_lines_and_columns(self) -> tuple[set[int], set[int]]:
-        lines_to_expand: set[int] = set()
-        columns_to_expand: set[int] = set(i for i, _ in enumerate(self.data[0]))
+def grow_bitmap(bitmap: bytearray, nb_bits: int) -> None:
+    """Add zero bytes to the bitmap until it can hold nb_bits bits"""
+    if (missing_bytes := (nb_bits + 7) // 8 - len(bitmap)) > 0:
+        bitmap.extend(bytes(missing_bytes))
 
-        for line_idx, line in enumerate(self.data):
-            # Gather galaxies indexes on this line
-            galaxies_indexes: set[int] = {
-                column_idx
-                for column_idx, char in enumerate(line)
-                if char == GALAXY_SYMBOL
-            }
 
-            # Remove galaxies indexes from columns to expand
-            columns_to_expand -= galaxies_indexes
+def set_bit(bitmap: bytearray, index: int) -> None:
+    bitmap[index >> 3] |= 1 << (index & 7)
 
-            # If we don't have any galaxy, the line will be expanded
-            if not galaxies_indexes:
-                lines_to_expand.add(line_idx)
 
-        return lines_to_expand, columns_to_expand
+def get_unset_bits(bitmap: bytearray, nb_bits: int) -> list[int]:
+    """Indexes of the bits set to 0 among the first nb_bits, sorted"""
+    unset_bits = ~int.from_bytes(bitmap, "little") & ((1 << nb_bits) - 1)
+    indexes: list[int] = []
+    while unset_bits:
+        lowest_bit = unset_bits & -unset_bits
+        indexes.append(lowest_bit.bit_length() - 1)
+        unset_bits ^= lowest_bit
+    return indexes
@@ -1,5 +1,7 @@
+from collections import defaultdict
 from enum import StrEnum
-from functools import cache, cached_property
+from functools import cached_property
+from typing import Iterable
 
 from scripts.utils import AbstractPuzzleSolver
 
@@ -20,11 +22,14 @@ class PuzzleSolver(AbstractPuzzleSolver):
     # DAY 12 - Second Part
     ###########################
 
+    # Number of copies of each row once unfolded
+    UNFOLD_FACTOR = 5
+
     def _solve_second_part(self) -> int:
         return sum(
             spring_row.nb_arrangements
             for line in self.lines
-            if (spring_row := SpringRow(line=line, unfold=True))
+            if (spring_row := SpringRow(line=line, unfold_factor=self.UNFOLD_FACTOR))
         )
 
 
@@ -38,86 +43,328 @@ class SpringState(StrEnum):
 
 
 class SpringRow:
-    states: tuple[SpringState]
-    damaged_groups_sizes: tuple[int]
+    """Row of springs, unfolded unfold_factor times : the states are repeated
+    and joined by an unknown spring, and the groups sizes are repeated."""
 
-    def __init__(self, line: str, unfold: bool = False):
-        states_data, sizes_data = line.split()
-
-        # Part 2, we unfold the spring
-        if unfold:
-            states_data = "?".join([states_data] * 5)
-            sizes_data = ",".join([sizes_data] * 5)
+    states: str
+    damaged_groups_sizes: tuple[int]
+    unfold_factor: int
 
-        # In order for the algorithm to process the end of groups correctly if
-        # we have a damaged spring at the end, we add an additional dot at the end
-        self.states = tuple(
-            [SpringState(state) for state in states_data] + [SpringState.OPERATIONAL]
-        )
+    def __init__(self, line: str, unfold_factor: int = 1):
+        self.states, sizes_data = line.split()
         self.damaged_groups_sizes = tuple(int(size) for size in sizes_data.split(","))
+        self.unfold_factor = unfold_factor
 
     def __repr__(self):
-        return "".join(self.states)
+        return SpringState.UNKNOWN.join([self.states] * self.unfold_factor)
 
     @cached_property
     def nb_arrangements(self) -> int:
-        return self.__compute_arrangements(
-            states=self.states, groups_sizes=self.damaged_groups_sizes
+        if self.unfold_factor == 1:
+            return self.__count_arrangements()
+        return self.__count_unfolded_arrangements()
+
+    def __count_arrangements(self) -> int:
+        """Count the arrangements with dynamic programming, from the end of the
+        row to its beginning : for a group index and a position, the number of
+        ways to place this group and the following ones starting from this
+        position. Only two rows of this table are kept in memory.
+        """
+        nb_states = len(self.states)
+
+        # Number of operational (or damaged) springs before each position, so
+        # that we know in O(1) if there is one in a given range
+        operational_counts = get_prefix_counts(self.states, SpringState.OPERATIONAL)
+        damaged_counts = get_prefix_counts(self.states, SpringState.DAMAGED)
+
+        # Without any group to place, there is only one arrangement if
+        # there is no damaged spring left, and none otherwise
+        next_ways = [
+            int(damaged_counts[position] == damaged_counts[nb_states])
+            for position in range(nb_states + 1)
+        ]
+        ways = [0] * (nb_states + 1)
+
+        for group_size in reversed(self.damaged_groups_sizes):
+            ways[nb_states] = 0
+            for position in reversed(range(nb_states)):
+                # First, the spring at this position can be operational
+                nb_ways = (
+                    ways[position + 1]
+                    if self.states[position] != SpringState.DAMAGED
+                    else 0
+                )
+
+                # Then, the group can start at this position if there is no
+                # operational spring in it, and no damaged spring just after
+                group_end = position + group_size
+                if (
+                    group_end <= nb_states
+                    and operational_counts[group_end] == operational_counts[position]
+                    and (
+                        group_end == nb_states
+                        or self.states[group_end] != SpringState.DAMAGED
+                    )
+                ):
+                    nb_ways += next_ways[min(group_end + 1, nb_states)]
+
+                ways[position] = nb_ways
+
+            ways, next_ways = next_ways, ways
+
+        return next_ways[0]
+
+    def __count_unfolded_arrangements(self) -> int:
+        """Count the arrangements copy after copy. Right after the spring
+        joining two copies, the state of an arrangement is the index of the
+        current group and the number of damaged springs already placed in it
+        (0 if the joining spring is operational). The transitions over a copy
+        only depend on the index of the group modulo the number of groups in a
+        copy (its phase) : they are computed once for the row.
+
+        The group index is phase + nb_passes * nb_groups_by_copy. For each
+        (phase, nb_damaged) state, the numbers of arrangements for all the
+        numbers of passes are packed in a single integer, one slot of
+        slot_width bits by number of passes. Applying a transition to all of
+        them is then a shift (the passes it completes) and a multiplication,
+        so each copy costs the same number of operations on these integers,
+        whatever the unfold factor. Only the numbers of passes from which all
+        the groups can still be placed are kept in the integers, but there
+        are more of them, and the slots are wider, with more copies : the
+        cost of each operation still grows with the unfold factor.
+        """
+        nb_groups_by_copy = len(self.damaged_groups_sizes)
+
+        # Copies are followed by the joining unknown spring, except the last
+        # one, followed by an operational spring to end its last group
+        copy_transitions = CopyTransitions(self.states, self.damaged_groups_sizes)
+        joining_states = [SpringState.UNKNOWN] * (self.unfold_factor - 1) + [
+            SpringState.OPERATIONAL
+        ]
+
+        # Over a copy, the number of arrangements is at most multiplied by
+        # the largest number of ways from a state, so the number of
+        # arrangements in a slot never exceeds max_nb_ways ^ unfold_factor
+        # (one more bit, so that slots are never empty)
+        reachable_states = copy_transitions.get_reachable_states(SpringState.UNKNOWN)
+        max_nb_ways = max(
+            copy_transitions.get_max_nb_ways(reachable_states, joining_state)
+            for joining_state in (SpringState.UNKNOWN, SpringState.OPERATIONAL)
         )
+        slot_width = self.unfold_factor * max_nb_ways.bit_length() + 1
 
-    @cache
-    def __compute_arrangements(
-        self,
-        states: tuple[SpringState],
-        groups_sizes: tuple[int],
-        current_counter: int = 0,
-    ) -> int:
-        # Stop condition of recursive function, verify that we don't have any
-        # group to search, and we're not in the middle of a group
-        if not states:
-            return not groups_sizes and not current_counter
-
-        # Initialize the number of arrangements
-        nb_arrangements = 0
-
-        # In an iteration, just check the current
-        # state and recursively process the others
-        next_state = states[0]
-        possible_states = (
-            [SpringState.DAMAGED, SpringState.OPERATIONAL]
-            if next_state == SpringState.UNKNOWN
-            else [next_state]
+        # Largest number of passes completed over a copy, to know when there
+        # are not enough copies left to place all the groups
+        max_nb_passes_by_copy = max(
+            copy_transitions.get_max_nb_passes(reachable_states, joining_state)
+            for joining_state in (SpringState.UNKNOWN, SpringState.OPERATIONAL)
         )
 
-        # Loop over possible states
-        for state in possible_states:
-            match state:
-                # If this is a damaged spring, we're continuing
-                # to fill in the current group
-                case SpringState.DAMAGED:
-                    nb_arrangements += self.__compute_arrangements(
-                        states[1:], groups_sizes, current_counter + 1
+        # (phase, damaged springs in the group) -> packed nb of arrangements,
+        # the first slot being for first_nb_passes passes
+        arrangements: dict[tuple[int, int], int] = {(0, 0): 1}
+        first_nb_passes = 0
+
+        for copy_idx, joining_state in enumerate(joining_states):
+            next_arrangements: dict[tuple[int, int], int] = defaultdict(int)
+            for (phase, nb_damaged), packed_arrangements in arrangements.items():
+                for (groups_delta, next_nb_damaged), nb_ways in copy_transitions.get(
+                    phase, nb_damaged, joining_state
+                ):
+                    nb_passes, next_phase = divmod(
+                        phase + groups_delta, nb_groups_by_copy
                     )
+                    next_arrangements[(next_phase, next_nb_damaged)] += (
+                        packed_arrangements << (nb_passes * slot_width)
+                    ) * nb_ways
+
+            # Drop the slots with too few passes to place all the groups in the
+            # remaining copies, and the ones with too many groups
+            nb_remaining_copies = self.unfold_factor - 1 - copy_idx
+            nb_dropped_slots = max(
+                self.unfold_factor
+                - nb_remaining_copies * max_nb_passes_by_copy
+                - first_nb_passes,
+                0,
+            )
+            first_nb_passes += nb_dropped_slots
+            slots_mask = (
+                1 << (slot_width * (self.unfold_factor - first_nb_passes + 1))
+            ) - 1
+            arrangements = {
+                state: (packed_arrangements >> (nb_dropped_slots * slot_width))
+                & slots_mask
+                for state, packed_arrangements in next_arrangements.items()
+            }
+
+        # All the groups must be placed, which is unfold_factor full passes
+        return (
+            arrangements.get((0, 0), 0)
+            >> ((self.unfold_factor - first_nb_passes) * slot_width)
+        ) & ((1 << slot_width) - 1)
+
+
+class CopyTransitions:
+    """Transitions over one copy of the springs and the spring joining it to
+    the next copy : from the state at the beginning of the copy (phase of the
+    group and damaged springs already placed in it), the states after the
+    joining spring, with their number of ways. Group indexes are relative to
+    the one at the beginning of the copy.
+    """
+
+    states: str
+    groups_sizes: tuple[int]
+
+    def __init__(self, states: str, groups_sizes: tuple[int]):
+        self.states = states
+        self.groups_sizes = groups_sizes
+        self.__walks: dict[tuple[int, int], dict[tuple[int, int], int]] = {}
+        self.__transitions: dict[tuple[int, int, SpringState], list] = {}
+
+    def get(
+        self, phase: int, nb_damaged: int, joining_state: SpringState
+    ) -> list[tuple[tuple[int, int], int]]:
+        key = (phase, nb_damaged, joining_state)
+        if key not in self.__transitions:
+            self.__transitions[key] = self.__compute_transitions(*key)
+        return self.__transitions[key]
+
+    def get_reachable_states(self, joining_state: SpringState) -> set[tuple[int, int]]:
+        """States (phase, damaged springs) at the copies boundaries which can
+        be reached from the beginning of the row, whatever the number of
+        copies"""
+        reachable_states = {(0, 0)}
+        states_to_visit = [(0, 0)]
+        while states_to_visit:
+            phase, nb_damaged = states_to_visit.pop()
+            for (groups_delta, next_nb_damaged), _ in self.get(
+                phase, nb_damaged, joining_state
+            ):
+                next_state = (
+                    (phase + groups_delta) % len(self.groups_sizes),
+                    next_nb_damaged,
+                )
+                if next_state not in reachable_states:
+                    reachable_states.add(next_state)
+                    states_to_visit.append(next_state)
+        return reachable_states
+
+    def get_max_nb_ways(
+        self, states: Iterable[tuple[int, int]], joining_state: SpringState
+    ) -> int:
+        """Largest number of ways to go over the copy from one of the states"""
+        return max(
+            sum(nb_ways for _, nb_ways in self.get(*state, joining_state))
+            for state in states
+        )
+
+    def get_max_nb_passes(
+        self, states: Iterable[tuple[int, int]], joining_state: SpringState
+    ) -> int:
+        """Largest number of passes over the groups completed over the copy
+        from one of the states"""
+        return max(
+            (
+                (phase + groups_delta) // len(self.groups_sizes)
+                for phase, nb_damaged in states
+                for (groups_delta, _), _ in self.get(phase, nb_damaged, joining_state)
+            ),
+            default=0,
+        )
+
+    def __compute_transitions(
+        self, phase: int, initial_nb_damaged: int, joining_state: SpringState
+    ) -> list[tuple[tuple[int, int], int]]:
+        """Add the joining spring to the walks over the copy, which don't
+        depend on it"""
+        key = (phase, initial_nb_damaged)
+        if key not in self.__walks:
+            self.__walks[key] = self.__walk(phase, initial_nb_damaged)
+
+        transitions: dict[tuple[int, int], int] = defaultdict(int)
+        for (groups_delta, nb_damaged), nb_ways in self.__walks[key].items():
+            group_size = self.groups_sizes[
+                (phase + groups_delta) % len(self.groups_sizes)
+            ]
+
+            # Operational spring, possible outside of a group, or
+            # just after a group which is then finished
+            if joining_state != SpringState.DAMAGED:
+                if not nb_damaged:
+                    transitions[(groups_delta, 0)] += nb_ways
+                elif nb_damaged == group_size:
+                    transitions[(groups_delta + 1, 0)] += nb_ways
+
+            # Damaged spring, possible if the group is not full yet
+            if joining_state != SpringState.OPERATIONAL and nb_damaged < group_size:
+                transitions[(groups_delta, nb_damaged + 1)] += nb_ways
+
+        return list(transitions.items())
+
+    @cached_property
+    def operational_counts(self) -> list[int]:
+        return get_prefix_counts(self.states, SpringState.OPERATIONAL)
+
+    def __walk(self, phase: int, initial_nb_damaged: int) -> dict[tuple[int, int], int]:
+        """Walk the copy from its beginning, jumping over whole groups : for
+        each position, the number of ways to place the springs before it,
+        without any group in progress, by relative group index"""
+        nb_states = len(self.states)
+        ways_by_position: list[dict[int, int]] = [
+            defaultdict(int) for _ in range(nb_states + 1)
+        ]
+
+        # (relative group index, damaged springs in the group) -> nb of ways
+        transitions: dict[tuple[int, int], int] = defaultdict(int)
+
+        def place_group(
+            position: int, groups_delta: int, nb_damaged: int, nb_ways: int
+        ) -> None:
+            """Place the rest of the current group from the position, if there
+            is no operational spring in it, and no damaged spring just after"""
+            group_size = self.groups_sizes[
+                (phase + groups_delta) % len(self.groups_sizes)
+            ]
+            group_end = position + group_size - nb_damaged
+            if (
+                self.operational_counts[min(group_end, nb_states)]
+                != self.operational_counts[position]
+            ):
+                return
+
+            if group_end < nb_states:
+                if self.states[group_end] != SpringState.DAMAGED:
+                    ways_by_position[group_end + 1][groups_delta + 1] += nb_ways
+            else:
+                # The group is still in progress at the end of the copy
+                transitions[(groups_delta, nb_damaged + nb_states - position)] += (
+                    nb_ways
+                )
+
+        # First, finish the group in progress, if any
+        if initial_nb_damaged:
+            place_group(0, 0, initial_nb_damaged, 1)
+        else:
+            ways_by_position[0][0] = 1
+
+        for position in range(nb_states):
+            for groups_delta, nb_ways in ways_by_position[position].items():
+                # The spring at this position can be operational
+                if self.states[position] != SpringState.DAMAGED:
+                    ways_by_position[position + 1][groups_delta] += nb_ways
+
+                # Or the next group can start at this position
+                place_group(position, groups_delta, 0, nb_ways)
+
+        for groups_delta, nb_ways in ways_by_position[nb_states].items():
+            transitions[(groups_delta, 0)] += nb_ways
+
+        return transitions
+
 
-                # Else, this is an operational spring. We may be at the
-                # end of an existing group, we have some checks
-                case SpringState.OPERATIONAL:
-                    # If the current_counter is not empty, it means we're in a group
-                    if current_counter:
-                        # We must check if it matches the next group size. If
-                        # that's the case, then we ended one group, and go next
-                        if groups_sizes:
-                            next_group_size = groups_sizes[0]
-                            if current_counter == next_group_size:
-                                nb_arrangements += self.__compute_arrangements(
-                                    states[1:], groups_sizes[1:]
-                                )
-                        # Else, it's the same case, we're still
-                        # in the middle of an ongoing group
-                    else:
-                        # Else, same arrangement, continue with next
-                        nb_arrangements += self.__compute_arrangements(
-                            states[1:], groups_sizes
-                        )
-
-        return nb_arrangements
+def get_prefix_counts(states: str, spring_state: SpringState) -> list[int]:
+    """Number of springs in the given state before each position"""
+    prefix_counts = [0] * (len(states) + 1)
+    for position, state in enumerate(states):
+        prefix_counts[position + 1] = prefix_counts[position] + (state == spring_state)
+    return prefix_counts
@@ -1,5 +1,3 @@
-from copy import deepcopy
-from dataclasses import dataclass
 from enum import StrEnum
 from functools import cached_property
 from typing import Iterable
@@ -16,79 +14,38 @@ class PuzzleSolver(AbstractPuzzleSolver):
         return list(self.__compute_patterns())
 
     def __compute_patterns(self) -> Iterable["Pattern"]:
-        cells: list[tuple["GroundCell"]] = []
+        pattern_lines: list[str] = []
 
-        for cells_row in self.lines:
+        for line in self.lines:
             # If we have an empty line, end of pattern
-            if not cells_row:
-                yield Pattern(cells=tuple(cells))
-                cells = []
+            if not line:
+                yield Pattern(pattern_lines)
+                pattern_lines = []
             # Else, add the current line
             else:
-                cells.append(tuple(GroundCell(type=elt) for elt in cells_row))
+                pattern_lines.append(line)
 
         # If we have some lines remaining (last line)
-        if cells:
-            yield Pattern(cells=tuple(cells))
+        if pattern_lines:
+            yield Pattern(pattern_lines)
 
-    def __patterns_sum(self, patterns: list["Pattern"]) -> int:
-        return sum(pattern.reflections_sum for pattern in patterns)
+    def __patterns_sum(self, nb_smudges: int) -> int:
+        return sum(pattern.get_reflections_sum(nb_smudges) for pattern in self.patterns)
 
     ###########################
     # DAY 13 - First Part
     ###########################
 
     def _solve_first_part(self) -> int:
-        return self.__patterns_sum(self.patterns)
+        return self.__patterns_sum(nb_smudges=0)
 
     ###########################
     # DAY 13 - Second Part
     ###########################
 
     def _solve_second_part(self) -> int:
-        return self.__patterns_sum(
-            self.__repaired_pattern(pattern) for pattern in self.patterns
-        )
-
-    def __repaired_pattern(self, pattern: "Pattern") -> "Pattern":
-        # We're going to try switching one pattern symbol at a time, and compute
-        # new reflections. If we find a new reflection pattern, we stop here and
-        # return the corresponding pattern
-        for i in range(pattern.nb_rows):
-            for j in range(pattern.nb_columns):
-                # Create new set of cells, and create a new pattern with it
-                new_cells = deepcopy(pattern.cells)
-                new_cells[i][j].type = (
-                    GroundType.ROCK
-                    if new_cells[i][j].type == GroundType.ASH
-                    else GroundType.ASH
-                )
-
-                new_pattern = Pattern(cells=new_cells)
-
-                # If the new pattern doesn't have any reflection, nothing to do
-                if new_pattern.reflections == Reflection({0}, {0}):
-                    continue
-
-                # If new pattern reflections are the same than current one,
-                # it's not the one we're searching for
-                if new_pattern.reflections == pattern.reflections:
-                    continue
-
-                # Remove simular reflections from new pattern. If it means
-                # not having any reflection, we put 0 a special "null" value.
-                new_pattern.reflections.vertical -= pattern.reflections.vertical
-                if not new_pattern.reflections.vertical:
-                    new_pattern.reflections.vertical = {0}
-
-                new_pattern.reflections.horizontal -= pattern.reflections.horizontal
-                if not new_pattern.reflections.horizontal:
-                    new_pattern.reflections.horizontal = {0}
-
-                return new_pattern
-
-        # We didn't found any new pattern, that's not normal, stop here
-        raise ValueError
+        # Each pattern has exactly one smudge, which gives a new reflection line
+        return self.__patterns_sum(nb_smudges=1)
 
 
 class GroundType(StrEnum):
@@ -96,119 +53,100 @@ class GroundType(StrEnum):
     ROCK = "#"
 
 
-@dataclass
-class GroundCell:
-    type: GroundType
-
-    def __repr__(self) -> str:
-        return self.type
-
-
-@dataclass
-class Reflection:
-    horizontal: set[int]
-    vertical: set[int]
+# Translation of a line of cells into a binary number, rocks are 1 and ashes are 0
+BINARY_TRANSLATION = str.maketrans({GroundType.ASH: "0", GroundType.ROCK: "1"})
 
 
-@dataclass
 class Pattern:
-    cells: tuple[tuple[GroundCell]]
-
-    def __init__(self, cells: tuple[tuple[GroundCell]]):
-        self.cells = cells
-
-    def __repr__(self) -> str:
-        return (
-            "\n"
-            + "\n".join("".join(str(ground_row)) for ground_row in self.cells)
-            + "\n"
-        )
-
-    @cached_property
-    def nb_rows(self) -> int:
-        return len(self.cells)
-
-    @cached_property
-    def rows(self) -> tuple[int]:
-        """Compute row values (one row equals an integer value)"""
-        return tuple(self.__cells_value(cells_row) for cells_row in self.cells)
+    """Pattern where each row and each column is stored as an integer, rocks
+    being 1 bits and ashes 0 bits."""
 
-    @cached_property
-    def nb_columns(self) -> int:
-        return len(self.cells[0])
+    rows: tuple[int]
+    columns: tuple[int]
 
-    @cached_property
-    def columns(self) -> tuple[int]:
-        cells_cols = [
-            [cells_row[i] for cells_row in self.cells] for i in range(self.nb_columns)
-        ]
-        return tuple(self.__cells_value(cells_col) for cells_col in cells_cols)
+    def __init__(self, lines: list[str]):
+        self.rows = tuple(int(line.translate(BINARY_TRANSLATION), 2) for line in lines)
+        self.columns = self.__get_columns(self.rows, width=len(lines[0]))
 
-    @cached_property
-    def reflections(self) -> Reflection:
-        """Tuple with horizontal reflections (rows) and vertical reflections (col)"""
-        return Reflection(
-            horizontal=self.__process_reflections(self.rows, self.nb_rows),
-            vertical=self.__process_reflections(self.columns, self.nb_columns),
+    @staticmethod
+    def __get_columns(rows: tuple[int], width: int) -> tuple[int]:
+        """Columns values, read from the bits of the rows values instead of
+        transposing the grid of cells : bit i of each column is the bit of
+        the corresponding column in row i, counted from the last row."""
+        columns = [0] * width
+        for row in rows:
+            for column_idx in range(width):
+                bit = (row >> (width - 1 - column_idx)) & 1
+                columns[column_idx] = (columns[column_idx] << 1) | bit
+        return tuple(columns)
+
+    def get_reflections_sum(self, nb_smudges: int = 0) -> int:
+        """Number of columns before the vertical reflection line, plus 100 times
+        the number of rows before the horizontal reflection line"""
+        return self.get_reflection(self.columns, nb_smudges) + (
+            100 * self.get_reflection(self.rows, nb_smudges)
         )
 
-    @cached_property
-    def reflections_sum(self) -> int:
-        """We assume the reflections only have one element each
-        when we're doing the sum calculation.
-        """
-        return next(iter(self.reflections.vertical)) + (
-            100 * next(iter(self.reflections.horizontal))
-        )
+    @classmethod
+    def get_reflection(cls, values: tuple[int], nb_smudges: int = 0) -> int:
+        """Number of values before the first reflection line having exactly
+        nb_smudges differences, or 0 if there is none"""
+        if nb_smudges == 0:
+            return next(iter(cls.get_perfect_reflections(values)), 0)
+        return cls.__get_smudged_reflection(values, nb_smudges)
 
     @staticmethod
-    def __cells_value(cells: tuple[GroundCell]) -> int:
-        """Compute cells as if rocks are 1 and ashes are 0. We have
-        a binary result that we translate into an integer.
+    def get_perfect_reflections(values: tuple[int]) -> list[int]:
+        """All the reflection lines without any difference, in linear time.
+
+        A reflection line is the center of an even-length palindrome of values
+        touching an edge. Manacher's algorithm computes the radius of the
+        longest even palindrome around every center, reusing the radiuses
+        mirrored inside the rightmost palindrome found so far.
         """
-        binary_number = "".join(
-            ("1" if cell.type == GroundType.ROCK else "0" for cell in cells)
-        )
-        return int(binary_number, 2)
+        nb_values = len(values)
+
+        # radiuses[i] : radius of the palindrome centered between i-1 and i
+        radiuses = [0] * nb_values
+        left, right = 0, -1
+        for center in range(nb_values):
+            radius = (
+                min(radiuses[left + right - center + 1], right - center + 1)
+                if center <= right
+                else 0
+            )
+            while (
+                center + radius < nb_values
+                and center - radius - 1 >= 0
+                and values[center + radius] == values[center - radius - 1]
+            ):
+                radius += 1
+
+            radiuses[center] = radius
+            if center + radius - 1 > right:
+                left, right = center - radius, center + radius - 1
+
+        return [
+            center
+            for center in range(1, nb_values)
+            if radiuses[center] == min(center, nb_values - center)
+        ]
 
     @staticmethod
-    def __process_reflections(cells_lists: tuple[int], nb_cells: int) -> set[int]:
-        # Calculate half number of cells for reflection calculation
-        half_nb_cells = round(nb_cells / 2)
-        found_cells: set[int] = set()
-
-        for cells_number, cells in enumerate(cells_lists):
-            # No check on first cell
-            if cells_number == 0:
-                continue
-
-            # If current cell is not the same than the
-            # previous one, continue the checks
-            if cells != cells_lists[cells_number - 1]:
-                continue
-
-            # Cells are the same, check forward and backward
-            is_valid_reflection = True
-            for i in range(1, half_nb_cells):
-                # First, we check if either one of the two cells are above
-                # the cells list. It means we passed the edge, reflection is valid
-                first_cells_number = cells_number - 1 - i
-                second_cells_number = cells_number + i
-                if first_cells_number < 0 or second_cells_number >= nb_cells:
-                    break
-
-                # If not at the edge, check if cells have the same value. If
-                # not,
-                if cells_lists[first_cells_number] != cells_lists[second_cells_number]:
-                    is_valid_reflection = False
+    def __get_smudged_reflection(values: tuple[int], nb_smudges: int) -> int:
+        """For each candidate line, the number of differences between two
+        mirrored values is the number of 1 bits of their XOR."""
+        for nb_values_before in range(1, len(values)):
+            nb_differences = 0
+            for before_idx, after_idx in zip(
+                range(nb_values_before - 1, -1, -1),
+                range(nb_values_before, len(values)),
+            ):
+                nb_differences += (values[before_idx] ^ values[after_idx]).bit_count()
+                if nb_differences > nb_smudges:
                     break
 
-            # If we calculated the reflection and found out it was
-            # OK, add the current cells number as number of cells
-            # before one reflection
-            if is_valid_reflection:
-                found_cells.add(cells_number)
+            if nb_differences == nb_smudges:
+                return nb_values_before
 
-        # Return found reflection cells if any, else it means we have
-        # not reflection so we return a set with only 0 as value
-        return found_cells or {0}
+        return 0
@@ -1,6 +1,8 @@
+from array import array
 from dataclasses import dataclass
-from enum import StrEnum
+from enum import Enum, StrEnum
 from functools import cached_property
+from random import Random
 
 from scripts.utils import AbstractPuzzleSolver
 
@@ -11,15 +13,11 @@ class PuzzleSolver(AbstractPuzzleSolver):
     ###########################
     @cached_property
     def platform(self) -> "Platform":
+        """Initial platform, never tilted : each part works on its own copy"""
         return self.__compute_plaform()
 
     def __compute_plaform(self) -> "Platform":
-        return Platform(
-            cells=tuple(
-                tuple(GroundCell(type=elt) for elt in cells_row)
-                for cells_row in self.lines
-            )
-        )
+        return Platform.from_lines(self.lines)
 
     ###########################
     # DAY 14 - First Part
@@ -27,16 +25,19 @@ class PuzzleSolver(AbstractPuzzleSolver):
 
     def _solve_first_part(self) -> int:
         # Tilt the platform towards north
-        self.platform.tilt()
+        platform = self.platform.copy()
+        platform.tilt(Direction.NORTH)
         # Return the total load
-        return self.platform.get_total_load()
+        return platform.total_load
 
     ###########################
     # DAY 14 - Second Part
     ###########################
 
+    NB_SPIN_CYCLES = 1_000_000_000
+
     def _solve_second_part(self) -> int:
-        return None
+        return self.platform.get_load_after_spin_cycles(self.NB_SPIN_CYCLES)
 
 
 class GroundType(StrEnum):
@@ -45,82 +46,266 @@ class GroundType(StrEnum):
     EMPTY = "."
 
 
-@dataclass
-class GroundCell:
-    type: GroundType
+class Direction(Enum):
+    """Tilt directions, with their (row, column) offsets"""
 
-    def __repr__(self) -> str:
-        return self.type
+    NORTH = (-1, 0)
+    WEST = (0, -1)
+    SOUTH = (1, 0)
+    EAST = (0, 1)
 
 
-@dataclass
-class Platform:
-    cells: tuple[tuple[GroundCell]]
+# A spin cycle tilts the platform north, then west, then south, then east
+SPIN_CYCLE = (Direction.NORTH, Direction.WEST, Direction.SOUTH, Direction.EAST)
 
-    def __init__(self, cells: tuple[tuple[GroundCell]]):
-        self.cells = cells
+# Maximum number of platform states kept in memory while looking for a cycle
+MAX_STORED_STATES = 10_000
+
+# Seed of the random keys used to hash platforms, fixed to get the same hashes
+# on every run
+ZOBRIST_SEED = 14
+
+
+@dataclass(frozen=True)
+class Segment:
+    """Run of cells between two cube rocks (or an edge) in a tilt direction.
+    Positions are ordered starting from the cell where round rocks pile up,
+    so that k round rocks in the segment always end up on its k first cells.
+    """
+
+    positions: tuple[int, ...]
+
+    # loads[k] : total load of the segment when it holds k round rocks
+    loads: tuple[int, ...]
+
+    # hashes[k] : Zobrist hash of the segment when it holds k round rocks
+    hashes: tuple[int, ...]
 
-    def __repr__(self) -> str:
-        return "\n" + "\n".join("".join(str(row)) for row in self.cells) + "\n"
+
+class PlatformLayout:
+    """Fixed part of the platform : its size, its cube rocks, and the segments
+    in which round rocks slide for each tilt direction. Position of a cell is
+    row_idx * nb_columns + column_idx.
+    """
+
+    nb_rows: int
+    nb_columns: int
+    cube_rocks: frozenset[int]
+
+    def __init__(self, nb_rows: int, nb_columns: int, cube_rocks: frozenset[int]):
+        self.nb_rows = nb_rows
+        self.nb_columns = nb_columns
+        self.cube_rocks = cube_rocks
+
+    def __len__(self):
+        return self.nb_rows * self.nb_columns
+
+    @cached_property
+    def zobrist_keys(self) -> tuple[int, ...]:
+        """Random 64 bits key of each cell, the hash of a platform is the XOR
+        of the keys of the cells holding a round rock"""
+        random = Random(ZOBRIST_SEED)
+        return tuple(random.getrandbits(64) for _ in range(len(self)))
+
+    def get_load(self, position: int) -> int:
+        """Load of a round rock, which is the number of rows from it to the
+        south edge, including its own row"""
+        return self.nb_rows - position // self.nb_columns
 
     @cached_property
-    def nb_rows(self) -> int:
-        return len(self.cells)
+    def segments(self) -> dict[Direction, list[Segment]]:
+        return {
+            direction: self.__compute_segments(direction) for direction in Direction
+        }
 
     @cached_property
-    def nb_columns(self) -> int:
-        return len(self.cells[0])
-
-    def tilt(self) -> None:
-        tilted_cells: list[list[GroundCell]] = []
-
-        for row_number, row in enumerate(self.cells):
-            new_row: list[GroundCell] = []
-
-            for col_number, cell in enumerate(row):
-                match cell.type:
-                    # Round rock case, we tilt it on top
-                    case GroundType.ROUND_ROCK:
-                        new_rock_row_number = 0  # default new row, top row
-
-                        # Check if the rock will encounter anything on his way.
-                        # If so, save the row number on which the rock will be
-                        for i in range(row_number - 1, -1, -1):
-                            if tilted_cells[i][col_number].type != GroundType.EMPTY:
-                                new_rock_row_number = i + 1
-                                break
-
-                        # Process the new current cell, either it's empty
-                        # if the rock moved, or it's the rock if it didn't move
-                        if new_rock_row_number == row_number:
-                            new_cell = cell
-                        else:
-                            # Modify the cell on which the rock will be if it moved
-                            tilted_cells[new_rock_row_number][col_number] = GroundCell(
-                                type=GroundType.ROUND_ROCK
-                            )
-                            new_cell = GroundCell(type=GroundType.EMPTY)
-
-                    case GroundType.CUBE_ROCK:
-                        new_cell = cell
-
-                    case GroundType.EMPTY:
-                        new_cell = cell
-
-                new_row.append(new_cell)
-
-            tilted_cells.append(new_row)
-
-        self.cells = tuple(tuple(row) for row in tilted_cells)
-
-    def get_total_load(self) -> int:
-        return sum(
-            self.__get_row_load(row, row_number)
-            for row_number, row in enumerate(self.cells)
+    def segments_ids(self) -> dict[Direction, array]:
+        """For each direction, index of the segment containing each cell"""
+        segments_ids: dict[Direction, array] = {}
+        for direction, segments in self.segments.items():
+            segments_ids[direction] = array("l", [-1]) * len(self)
+            for segment_id, segment in enumerate(segments):
+                for position in segment.positions:
+                    segments_ids[direction][position] = segment_id
+        return segments_ids
+
+    def __compute_segments(self, direction: Direction) -> list[Segment]:
+        row_offset, column_offset = direction.value
+
+        # Lanes are the columns for a vertical tilt, the rows otherwise
+        if row_offset:
+            lanes = [
+                [
+                    row_idx * self.nb_columns + column_idx
+                    for row_idx in range(self.nb_rows)
+                ]
+                for column_idx in range(self.nb_columns)
+            ]
+        else:
+            lanes = [
+                [
+                    row_idx * self.nb_columns + column_idx
+                    for column_idx in range(self.nb_columns)
+                ]
+                for row_idx in range(self.nb_rows)
+            ]
+
+        # Rocks pile up at the end of the lanes when tilting south or east
+        if row_offset > 0 or column_offset > 0:
+            lanes = [lane[::-1] for lane in lanes]
+
+        segments: list[Segment] = []
+        for lane in lanes:
+            positions: list[int] = []
+            for position in lane + [None]:
+                if position is not None and position not in self.cube_rocks:
+                    positions.append(position)
+                    continue
+
+                # Cube rock or end of the lane, end of the current segment
+                if positions:
+                    segments.append(self.__get_segment(positions))
+                    positions = []
+
+        return segments
+
+    def __get_segment(self, positions: list[int]) -> Segment:
+        loads, hashes = [0], [0]
+        for position in positions:
+            loads.append(loads[-1] + self.get_load(position))
+            hashes.append(hashes[-1] ^ self.zobrist_keys[position])
+        return Segment(
+            positions=tuple(positions), loads=tuple(loads), hashes=tuple(hashes)
+        )
+
+
+class Platform:
+    """Platform stored as the positions of its round rocks on a fixed layout.
+    Tilting only counts the round rocks of each segment, then piles them up,
+    which costs O(rocks + segments). The total load and the Zobrist hash of
+    the platform are updated from the counts, without scanning the grid.
+    """
+
+    layout: PlatformLayout
+    round_rocks: list[int]
+    total_load: int
+    zobrist_hash: int
+
+    def __init__(self, layout: PlatformLayout, round_rocks: list[int]):
+        self.layout = layout
+        self.round_rocks = round_rocks
+        self.total_load = sum(layout.get_load(position) for position in round_rocks)
+        self.zobrist_hash = 0
+        for position in round_rocks:
+            self.zobrist_hash ^= layout.zobrist_keys[position]
+
+    @classmethod
+    def from_lines(cls, lines: list[str]) -> "Platform":
+        cells = "".join(lines)
+        layout = PlatformLayout(
+            nb_rows=len(lines),
+            nb_columns=len(lines[0]),
+            cube_rocks=frozenset(
+                position
+                for position, cell in enumerate(cells)
+                if cell == GroundType.CUBE_ROCK
+            ),
         )
+        round_rocks = [
+            position
+            for position, cell in enumerate(cells)
+            if cell == GroundType.ROUND_ROCK
+        ]
+        return cls(layout=layout, round_rocks=round_rocks)
+
+    def copy(self) -> "Platform":
+        # The layout never changes, it can be shared between platforms
+        platform = Platform.__new__(Platform)
+        platform.layout = self.layout
+        platform.round_rocks = self.round_rocks.copy()
+        platform.total_load = self.total_load
+        platform.zobrist_hash = self.zobrist_hash
+        return platform
+
+    def __repr__(self) -> str:
+        cells = [GroundType.EMPTY] * len(self.layout)
+        for position in self.layout.cube_rocks:
+            cells[position] = GroundType.CUBE_ROCK
+        for position in self.round_rocks:
+            cells[position] = GroundType.ROUND_ROCK
 
-    def __get_row_load(self, row: list[GroundCell], row_number: int) -> int:
-        nb_round_rocks = len(
-            [cell for cell in row if cell.type == GroundType.ROUND_ROCK]
+        nb_columns = self.layout.nb_columns
+        rows = (
+            "".join(cells[row_start : row_start + nb_columns])
+            for row_start in range(0, len(cells), nb_columns)
         )
-        return nb_round_rocks * (self.nb_rows - row_number)
+        return "\n" + "\n".join(rows) + "\n"
+
+    def tilt(self, direction: Direction) -> None:
+        segments = self.layout.segments[direction]
+        segments_ids = self.layout.segments_ids[direction]
+
+        nb_round_rocks = [0] * len(segments)
+        for position in self.round_rocks:
+            nb_round_rocks[segments_ids[position]] += 1
+
+        # Rocks pile up on the first cells of their segment, load and hash
+        # of these cells are already known for any number of rocks
+        self.round_rocks = []
+        self.total_load = 0
+        self.zobrist_hash = 0
+        for segment, nb_rocks in zip(segments, nb_round_rocks):
+            if nb_rocks:
+                self.round_rocks.extend(segment.positions[:nb_rocks])
+                self.total_load += segment.loads[nb_rocks]
+                self.zobrist_hash ^= segment.hashes[nb_rocks]
+
+    def spin_cycle(self) -> None:
+        for direction in SPIN_CYCLE:
+            self.tilt(direction)
+
+    def get_load_after_spin_cycles(
+        self, nb_cycles: int, max_stored_states: int = MAX_STORED_STATES
+    ) -> int:
+        """Total load after nb_cycles spin cycles, the platform itself is left
+        untouched. As soon as a state comes back, the platform is in a loop, so
+        the load after nb_cycles is the one at the same place in the loop.
+
+        Only max_stored_states states are kept : when the limit is reached,
+        they are forgotten and the search starts again from the current state,
+        which still finds any loop shorter than the limit.
+        """
+        platform = self.copy()
+
+        # States seen by hash, with the number of cycles after which they were
+        # seen, and loads after each cycle, since the states were last forgotten.
+        # Full states are only compared when two hashes are equal : after a
+        # spin cycle, round rocks are always listed in the same order, and
+        # tilting builds a new list, so the lists can be kept as they are.
+        seen_states: dict[int, list[tuple[list[int], int]]] = {}
+        nb_stored_states = 0
+        loads: list[int] = []
+        first_stored_cycle = 0
+
+        for cycle_idx in range(nb_cycles):
+            same_hash_states = seen_states.get(platform.zobrist_hash, [])
+            for round_rocks, loop_start in same_hash_states:
+                if round_rocks == platform.round_rocks:
+                    loop_length = cycle_idx - loop_start
+                    loop_offset = (nb_cycles - loop_start) % loop_length
+                    return loads[loop_start - first_stored_cycle + loop_offset]
+
+            if nb_stored_states >= max_stored_states:
+                seen_states.clear()
+                loads.clear()
+                nb_stored_states = 0
+                first_stored_cycle = cycle_idx
+
+            seen_states.setdefault(platform.zobrist_hash, []).append(
+                (platform.round_rocks, cycle_idx)
+            )
+            nb_stored_states += 1
+            loads.append(platform.total_load)
+            platform.spin_cycle()
+
+        return platform.total_load
@@ -2,8 +2,9 @@ import os
 from abc import ABC, abstractmethod
 from enum import Enum, auto
 from functools import cached_property
+from math import gcd
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterable
 
 import httpx
 from rich import print
@@ -65,6 +66,49 @@ def min_and_max(first: Any, second: Any) -> tuple[Any, Any]:
     return min(first, second), max(first, second)
 
 
+def solve_congruences(congruences: Iterable[tuple[int, int]]) -> tuple[int, int] | None:
+    """Generalized chinese remainder theorem : find x such as x = remainder
+    (mod modulus) for all the (remainder, modulus) congruences, moduli not
+    being necessarily coprime. Return (x, lcm of moduli) with the smallest
+    non-negative x, or None if there is no solution.
+    """
+    solution, solution_modulus = 0, 1
+    for remainder, modulus in congruences:
+        divisor = gcd(solution_modulus, modulus)
+        if (remainder - solution) % divisor:
+            return None
+
+        # Find k such as solution + k * solution_modulus = remainder (mod modulus)
+        reduced_modulus = modulus // divisor
+        k = (
+            (remainder - solution)
+            // divisor
+            * pow(solution_modulus // divisor, -1, reduced_modulus)
+        ) % reduced_modulus
+
+        solution += k * solution_modulus
+        solution_modulus *= reduced_modulus
+        solution %= solution_modulus
+
+    return solution, solution_modulus
+
+
+def count_interior_points(vertices: list[tuple[int, int]]) -> int:
+    """Number of integer points strictly inside a polygon, given its vertices
+    (integer coordinates) in order. The area is computed with the shoelace
+    formula, then Pick's theorem gives the interior points count :
+    area = interior_points + boundary_points / 2 - 1
+    """
+    double_area = 0
+    nb_boundary_points = 0
+    for (x1, y1), (x2, y2) in zip(vertices, vertices[1:] + vertices[:1]):
+        double_area += x1 * y2 - x2 * y1
+        # Integer points on the edge, excluding one of the vertices
+        nb_boundary_points += gcd(abs(x2 - x1), abs(y2 - y1))
+
+    return (abs(double_area) - nb_boundary_points) // 2 + 1
+
+
 def create_empty_file(file_path: Path) -> None:
     if not file_path.exists():
         file_path.touch()